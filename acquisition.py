@@ -0,0 +1,324 @@
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+import metrics
+from scheduler import RateScheduler
+
+# One sensor reading: monotonic timestamp (s) and the raw Fx, Fy, Fz, Tx, Ty, Tz values
+Sample = namedtuple('Sample', ['time', 'data'])
+
+# Data of a sensor that has not delivered any sample (see SampleAligner)
+STALE_DATA = (float('nan'),) * 6
+
+def compute_z_force(nula, data):
+    """Convert the raw Z reading into force in newtons relative to the zero value."""
+    return (nula - data[2]) / 1000000
+
+class SampleRing:
+    """Bounded ring buffer that hands the same samples to any number of consumers."""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._buffer = [None] * capacity
+        self._seq = 0  # Total number of samples ever published
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def publish(self, sample):
+        """Store a sample, overwriting the oldest one when the buffer is full."""
+        with self._cond:
+            self._buffer[self._seq % self.capacity] = sample
+            self._seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        """Wake up all consumers; they drain what is left and then get None."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def subscribe(self):
+        """Create a consumer cursor starting at the next published sample."""
+        return Subscription(self)
+
+class Subscription:
+    """Read cursor of one consumer. A consumer that falls behind loses the oldest samples."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        with ring._cond:
+            self.cursor = ring._seq
+        self.dropped = 0
+
+    @property
+    def closed(self):
+        return self.ring.closed
+
+    def _wait(self, timeout):
+        """Wait until a sample past the cursor exists; returns False on timeout or close."""
+        ring = self.ring
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.cursor == ring._seq:
+            if ring._closed:
+                return False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            ring._cond.wait(remaining)
+        oldest = ring._seq - ring.capacity
+        if self.cursor < oldest:
+            self.dropped += oldest - self.cursor
+            self.cursor = oldest
+        return True
+
+    def get(self, timeout=None):
+        """Return the next sample, or None on timeout or when the ring is closed."""
+        ring = self.ring
+        with ring._cond:
+            if not self._wait(timeout):
+                return None
+            sample = ring._buffer[self.cursor % ring.capacity]
+            self.cursor += 1
+            return sample
+
+    def get_batch(self, max_items, timeout=None):
+        """Return up to max_items pending samples (empty list on timeout or close)."""
+        ring = self.ring
+        with ring._cond:
+            if not self._wait(timeout):
+                return []
+            end = min(ring._seq, self.cursor + max_items)
+            batch = [ring._buffer[i % ring.capacity] for i in range(self.cursor, end)]
+            self.cursor = end
+            return batch
+
+    def get_latest(self, timeout=None):
+        """Skip to the newest sample. Skipped samples are not counted as dropped."""
+        ring = self.ring
+        with ring._cond:
+            if not self._wait(timeout):
+                return None
+            self.cursor = ring._seq
+            return ring._buffer[(self.cursor - 1) % ring.capacity]
+
+class SampleAligner:
+    """Aligns the samples of several sensors on the timestamps of the first one.
+
+    Every acquisition stamps its samples with the same monotonic clock. For each sample
+    of the first (reference) subscription, get_batch returns a Sample whose data is a
+    tuple with the raw data of every sensor: the reference sample itself and, for the
+    other sensors, their latest sample taken at or before it. A reference sample is
+    only returned once every other sensor has a newer sample (or has stopped), so the
+    result does not depend on which thread ran first; this delays the output by at
+    most one sample period of the slowest sensor. Reference samples taken before every
+    sensor delivered its first sample are skipped.
+
+    A sensor that delivers nothing for stale_after seconds no longer holds the others
+    back: it is treated as stale and its last sample is repeated (STALE_DATA, all NaN,
+    if it never delivered one) until it delivers again. At most max_pending samples are
+    kept per sensor while waiting; older ones are dropped and counted in dropped.
+    """
+
+    def __init__(self, subscriptions, max_pending=4096, stale_after=0.5):
+        self.subscriptions = subscriptions
+        self.max_pending = max_pending
+        self.stale_after = stale_after
+        self._pending = [deque() for _ in subscriptions]  # Received but not yet aligned
+        self._latest = [None] * len(subscriptions)  # Data held for the other sensors
+        self._overflow = 0
+
+    @property
+    def closed(self):
+        return self.subscriptions[0].closed
+
+    @property
+    def dropped(self):
+        return sum(s.dropped for s in self.subscriptions) + self._overflow
+
+    def _receive(self, i, samples):
+        queue = self._pending[i]
+        queue.extend(samples)
+        while len(queue) > self.max_pending:
+            queue.popleft()
+            self._overflow += 1
+
+    def get_batch(self, max_items, timeout=None):
+        """Return up to max_items aligned samples (empty list on timeout or close)."""
+        reference, others = self.subscriptions[0], self.subscriptions[1:]
+        if not others:
+            return reference.get_batch(max_items, timeout)
+        pending = self._pending
+        self._receive(0, reference.get_batch(min(max_items, self.max_pending), timeout))
+        for i, subscription in enumerate(others, 1):
+            self._receive(i, subscription.get_batch(self.max_pending, timeout=0))
+
+        batch = []
+        latest = self._latest
+        stale_before = time.monotonic() - self.stale_after
+        while pending[0] and len(batch) < max_items:
+            t = pending[0][0].time
+            ready = True
+            for i in range(1, len(pending)):
+                queue = pending[i]
+                while queue and queue[0].time <= t:
+                    latest[i] = queue.popleft().data
+                if not queue and not self.subscriptions[i].closed:
+                    if t >= stale_before:
+                        ready = False  # The next sample of sensor i may still be at or before t
+                    elif latest[i] is None:
+                        latest[i] = STALE_DATA  # Stale before its first sample
+            if not ready:
+                break
+            sample = pending[0].popleft()
+            if any(data is None for data in latest[1:]):
+                continue  # Not every sensor has started yet
+            batch.append(Sample(t, (sample.data,) + tuple(latest[1:])))
+        return batch
+
+class SensorGroup:
+    """Several running acquisitions that are logged together as one multi-column log.
+
+    Quacks like an Acquisition for CsvLogger: subscribe() returns a SampleAligner over
+    all sensors, rate and streaming are those of the first one.
+    """
+
+    def __init__(self, acquisitions):
+        self.acquisitions = acquisitions
+        self.rate = acquisitions[0].rate
+        self.streaming = acquisitions[0].streaming
+
+    def __len__(self):
+        return len(self.acquisitions)
+
+    def subscribe(self):
+        return SampleAligner([a.subscribe() for a in self.acquisitions])
+
+class Decimator:
+    """Reduces a sample stream by a fixed factor, keeping every Nth sample or the mean of N."""
+
+    def __init__(self, factor=1, average=False):
+        self.factor = max(1, int(factor))
+        self.average = average
+        self._count = 0
+        self._sums = None
+
+    def add(self, sample):
+        """Feed one sample; returns the reduced sample every factor samples, otherwise None."""
+        self._count += 1
+        if self.average:
+            if self._sums is None:
+                self._sums = list(sample.data)
+            else:
+                self._sums = [a + b for a, b in zip(self._sums, sample.data)]
+        if self._count < self.factor:
+            return None
+        if self.average:
+            sample = Sample(sample.time, tuple(v / self._count for v in self._sums))
+        self._count = 0
+        self._sums = None
+        return sample
+
+class Acquisition:
+    """Reads the sensor on a single thread and publishes every sample to a SampleRing.
+
+    In polling mode every sample is requested with getMeasurement at a fixed rate,
+    paced by a RateScheduler.
+    In streaming mode the sensor sends RDT packets at its own (kHz) rate and every
+    packet is received with sensor.receive().
+    With several sensors, every sensor has its own Acquisition; name is used in the
+    reports and metric_suffix keeps their metrics apart.
+    """
+
+    def __init__(self, sensor, rate=100.0, capacity=4096, streaming=False, name='Acquisition',
+                 metric_suffix=''):
+        self.sensor = sensor
+        self.name = name
+        self.metric_suffix = metric_suffix
+        self.rate = rate
+        self.scheduler = None
+        self.streaming = streaming
+        self.ring = SampleRing(capacity)
+        self._running = False
+        self._thread = None
+
+    def subscribe(self):
+        return self.ring.subscribe()
+
+    def start(self):
+        m = metrics.get()
+        if m is not None:
+            m.gauge('acq_overruns' + self.metric_suffix,
+                    lambda: self.scheduler.stats.overruns if self.scheduler else 0)
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.ring.close()
+        if self.scheduler is not None:
+            self.scheduler.report()
+
+    def _run(self):
+        try:
+            if self.streaming:
+                self._run_streaming()
+            else:
+                self._run_polling()
+        except EOFError as e:
+            print(f"{self.name}: {e}")  # A replayed log has ended
+        except Exception as e:
+            print(f"{self.name}: error reading sensor: {e}")
+        finally:
+            self.ring.close()
+
+    def _run_polling(self):
+        self.scheduler = RateScheduler(self.rate, name=self.name)
+        m = metrics.get()
+        suffix = self.metric_suffix
+        while self._running:
+            if m is not None:
+                t0 = time.perf_counter_ns()
+            data = self.sensor.getMeasurement()
+            if m is not None:
+                m.observe('sensor_read' + suffix, time.perf_counter_ns() - t0)
+            if len(data) > 2:  # Check if force data is valid
+                self.ring.publish(Sample(time.monotonic(), tuple(data)))
+                if m is not None:
+                    m.count('samples' + suffix)
+            else:
+                print("Error: Sensor data invalid, force array too short")
+                if m is not None:
+                    m.count('invalid_samples' + suffix)
+            self.scheduler.wait()
+
+    def _run_streaming(self):
+        sensor = self.sensor
+        sensor.sock.settimeout(0.5)  # So that stop() is noticed even if packets stop arriving
+        sensor.startStreaming(False)  # Receive the RDT packets ourselves, without the NetFT handler thread
+        m = metrics.get()
+        suffix = self.metric_suffix
+        try:
+            while self._running:
+                if m is not None:
+                    t0 = time.perf_counter_ns()
+                try:
+                    data = sensor.receive()
+                except socket.timeout:
+                    if m is not None:
+                        m.count('sensor_timeouts' + suffix)
+                    continue
+                if m is not None:
+                    m.observe('sensor_read' + suffix, time.perf_counter_ns() - t0)  # Includes waiting for the packet
+                    m.count('samples' + suffix)
+                self.ring.publish(Sample(time.monotonic(), tuple(data)))
+        finally:
+            sensor.send(0)  # Stop the RDT stream
@@ -1,45 +1,48 @@
-import os
+import argparse
 import csv
-import tkinter as tk
-from tkinter import filedialog
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import catalog
+from loader import is_log_file, iter_log_chunks, list_sessions
+from summary import ForceSummary
+
+SUMMARY_COLUMNS = ['file', 'samples', 'duration', 'min', 'max', 'mean', 'peak_time']
 
 def choose_directory():
     """Funkcija koja omogućuje odabir mape s .csv datotekama."""
+    # Tkinter se uvozi tek ovdje da skupni način radi i bez grafičkog sučelja
+    import tkinter as tk
+    from tkinter import filedialog
     root = tk.Tk()
     root.withdraw()  # Sakrij Tkinter glavni prozor
     folder_path = filedialog.askdirectory(title="Odaberite mapu s .csv datotekama")
     return folder_path
 
 def process_csv_files(folder_path):
-    """Učitaj sve .csv datoteke iz odabrane mape i pronađi maksimalni iznos iz 2. stupca."""
+    """Učitaj sve .csv (i binarne) datoteke iz odabrane mape i pronađi maksimalni iznos iz 2. stupca.
+
+    Datoteke koje su već upisane u katalog mape ne čitaju se ponovno.
+    """
     max_values = []
-    
-    # Prođi kroz sve datoteke u odabranoj mapi
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".csv"):
-            file_path = os.path.join(folder_path, filename)
-            print(f"Procesiranje datoteke: {file_path}")
-            
-            with open(file_path, mode='r') as file:
-                csv_reader = csv.reader(file)
-                next(csv_reader)  # Preskoči header
-                
-                second_column_values = []
-                
-                # Učitaj sve retke i pohrani vrijednosti iz 2. stupca
-                for row in csv_reader:
-                    if len(row) > 1:  # Provjera da li postoji 2. stupac
-                        try:
-                            value = float(row[1])  # Pretvori vrijednost u float
-                            second_column_values.append(value)
-                        except ValueError:
-                            print(f"Nevaljana vrijednost u retku: {row}")
-                
-                if second_column_values:
-                    max_value = max(second_column_values)
-                    max_values.append(max_value)
-                    print(f"Maksimalna vrijednost u 2. stupcu za {filename} je {max_value}")
+    files = find_log_files([folder_path])
+    results, missing = lookup_catalog(files)
+    print(f"Datoteka u katalogu: {len(results)}, za obradu: {len(missing)}")
+
+    # Prođi kroz datoteke kojih nema u katalogu i dodaj ih u katalog
+    for file_path in missing:
+        print(f"Procesiranje datoteke: {file_path}")
+        result = try_file_statistics(file_path)
+        if result is not None:
+            results[file_path] = result
+    update_catalog([results[f] for f in missing if f in results])
+
+    for file_path in files:
+        result = results.get(file_path)
+        if result is not None and result['samples']:
+            max_values.append(result['max'])
+            print(f"Maksimalna vrijednost u 2. stupcu za {os.path.basename(file_path)} je {result['max']}")
     
     return max_values
 
@@ -53,7 +56,112 @@ def calculate_mean(max_values):
         print("Nema maksimalnih vrijednosti za izračun.")
         return None
 
-if __name__ == "__main__":
+def find_log_files(folders, recursive=False):
+    """Vrati sortirani popis svih zapisa (.csv, binarnih i komprimiranih) u zadanim mapama.
+
+    Sesija podijeljena u dijelove (.partNNN) navodi se jednom, putem prvog dijela.
+    """
+    files = []
+    for folder in folders:
+        if recursive:
+            for dirpath, _, filenames in os.walk(folder):
+                files.extend(os.path.join(dirpath, f) for f in filenames if is_log_file(f))
+        else:
+            files.extend(os.path.join(folder, f) for f in os.listdir(folder) if is_log_file(f))
+    return list_sessions(sorted(files))
+
+def file_statistics(file_path):
+    """Statistika jedne datoteke u jednom prolazu, dio po dio, bez učitavanja cijelog stupca."""
+    # Ključ se uzima prije čitanja: ako sesija za vrijeme čitanja dobije još podataka,
+    # upis u katalogu više ne odgovara i datoteka se idući put ponovno obrađuje
+    key = catalog.session_key(file_path)
+    summary = ForceSummary()
+    for time_data, force_data in iter_log_chunks(file_path):
+        summary.update(time_data, force_data)
+    result = summary.as_dict()
+    result['file'] = file_path
+    result['key'] = key
+    return result
+
+def try_file_statistics(file_path):
+    """file_statistics koja ne prekida skupnu obradu: za datoteku koja se ne može pročitati vraća None."""
+    try:
+        return file_statistics(file_path)
+    except Exception as e:
+        print(f"Datoteka {file_path} nije obrađena: {e!r}")
+        return None
+
+def lookup_catalog(files):
+    """Statistika iz kataloga za nepromijenjene datoteke; vraća (rezultati po datoteci, datoteke koje nedostaju)."""
+    by_folder = {}
+    for file_path in files:
+        by_folder.setdefault(os.path.dirname(file_path), []).append(file_path)
+    results = {}
+    for folder, folder_files in by_folder.items():
+        try:
+            rows = catalog.lookup(folder or '.', [os.path.basename(f) for f in folder_files])
+        except sqlite3.Error as e:
+            print(f"Katalog u mapi {folder} nije čitljiv: {e}")
+            rows = {}
+        for file_path in folder_files:
+            row = rows.get(os.path.basename(file_path))
+            if row is not None:
+                results[file_path] = {key: row[key] for key in SUMMARY_COLUMNS if key != 'file'}
+                results[file_path]['file'] = file_path
+    missing = [f for f in files if f not in results]
+    return results, missing
+
+def update_catalog(results):
+    """Upiši statistiku ponovno pročitanih datoteka u katalog njihove mape."""
+    for result in results:
+        try:
+            catalog.record_session(result['file'], result, key=result.get('key'))
+        except (sqlite3.Error, OSError) as e:
+            print(f"Katalog nije ažuriran za {result['file']}: {e}")
+
+def write_summary_table(results, output_path):
+    """Spremi statistiku po datotekama u .csv tablicu."""
+    with open(output_path, mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Tablica spremljena kao {output_path}")
+
+def batch_statistics(folders, output_path, workers=None, recursive=False):
+    """Skupna obrada: statistika svih datoteka u paralelnim procesima i zapis u tablicu."""
+    # Tablica rezultata nije zapis mjerenja, čak ni ako je spremljena u istu mapu
+    files = [f for f in find_log_files(folders, recursive)
+             if os.path.abspath(f) != os.path.abspath(output_path)]
+    results, missing = lookup_catalog(files)
+    print(f"Pronađeno {len(files)} datoteka, u katalogu {len(results)}, za obradu {len(missing)}")
+    failed = []
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for file_path, result in zip(missing, executor.map(try_file_statistics, missing, chunksize=4)):
+                if result is None:
+                    failed.append(file_path)
+                else:
+                    results[file_path] = result
+        update_catalog([results[f] for f in missing if f in results])
+    if failed:
+        print(f"Neobrađene datoteke ({len(failed)}): " + ", ".join(failed))
+    results = [results[f] for f in files if f in results]
+    write_summary_table(results, output_path)
+    return [r['max'] for r in results if r['samples']]
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistika maksimalnih sila iz zapisa mjerenja")
+    parser.add_argument('folders', nargs='*', help="Mape sa zapisima (bez mapa otvara se dijalog)")
+    parser.add_argument('-o', '--output', default='summary.csv', help="Tablica rezultata skupne obrade (zadano summary.csv)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Broj paralelnih procesa (zadano broj jezgri)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Obradi i podmape")
+    args = parser.parse_args()
+
+    if args.folders:
+        max_values = batch_statistics(args.folders, args.output, args.workers, args.recursive)
+        calculate_mean(max_values)
+        return
+
     folder_path = choose_directory()
     
     if folder_path:
@@ -61,3 +169,6 @@ if __name__ == "__main__":
         calculate_mean(max_values)
     else:
         print("Mapa nije odabrana.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from loader import CHUNK_PATTERN, is_log_file, list_sessions, load_log_data
+from scheduler import PeriodStats
+from simulator import FakeNetFT, FakePLC, decode_sequence
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+def percentiles(values):
+    """min/p50/p99/max of a sequence, formatted in milliseconds."""
+    if not len(values):
+        return "n/a"
+    values = np.sort(np.asarray(values)) * 1000
+    p50, p99 = values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"min/p50/p99/max = {values[0]:.3f}/{p50:.3f}/{p99:.3f}/{values[-1]:.3f} ms"
+
+def period_stats(name, times, rate=None):
+    stats = PeriodStats(name, rate)
+    for t in times:
+        stats.mark(t)
+    return stats
+
+def log_files(log_dir, suffix=''):
+    """Session logs written by main.py, in the order they were started; one path per rotated session."""
+    names = [f for f in os.listdir(log_dir) if is_log_file(f) and suffix + '.' in f]
+    names.sort(key=lambda f: (CHUNK_PATTERN.sub(r'\1', f), f))  # Session file names start with their start time
+    return list_sessions([os.path.join(log_dir, f) for f in names])
+
+def run_main(sensor_hosts, plc, log_dir, main_args, timeout):
+    """Run main.py against the fakes until the PLC has finished its cycles; returns its output."""
+    command = [sys.executable, MAIN_SCRIPT] + sensor_hosts + ['-c',
+               '--plc-host', '127.0.0.1', '--plc-port', str(plc.port), '--log-dir', log_dir] + main_args
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        plc.done.wait(timeout)
+    finally:
+        if os.name == 'nt':
+            process.terminate()  # No SIGINT for a child on Windows; the final reports are lost
+        else:
+            process.send_signal(signal.SIGINT)  # Same as CTRL+C, so main.py shuts down cleanly
+        try:
+            output, _ = process.communicate(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            output, _ = process.communicate()
+    return output
+
+def report_plc(sensor, plc, batched=False):
+    if batched:
+        values, gaps = plc.received_batches()
+        print(f"PLC: {len(values)} values received in batched frames, {gaps} sequence gaps")
+    else:
+        values = plc.received_floats()
+        print(f"PLC: {len(values)} values received")
+    if len(values) < 2:
+        return
+    arrivals = [arrival for arrival, _ in values]
+    latencies = []
+    for arrival, value in values:
+        sequence = decode_sequence(value)
+        if 1 <= sequence <= len(sensor.send_times):
+            latencies.append(arrival - sensor.send_times[sequence - 1])
+    print(f"  achieved rate {(len(values) - 1) / (arrivals[-1] - arrivals[0]):.1f} Hz")
+    print(f"  latency sensor -> PLC {percentiles(latencies)}")
+    period_stats('  PLC receive', arrivals).report()
+
+def report_logging(sensor, plc, log_dir, suffix=''):
+    toggles_on = [t for t, state in plc.toggles if state]
+    files = log_files(log_dir, suffix)
+    print(f"Logging: {len(toggles_on)} flag raises, {len(files)} session files")
+    start_latencies = []
+    for toggle_time, file_path in zip(toggles_on, files):
+        time_data, force_data = load_log_data(file_path, use_cache=False)
+        if not len(time_data):
+            print(f"  {os.path.basename(file_path)}: empty")
+            continue
+        sequence = decode_sequence(float(force_data[0]))
+        start_latencies.append(sensor.send_times[sequence - 1] - toggle_time)
+        intervals = np.diff(np.asarray(time_data, dtype=np.float64))
+        rate = (len(time_data) - 1) / (time_data[-1] - time_data[0]) if len(time_data) > 1 else 0.0
+        print(f"  {os.path.basename(file_path)}: {len(time_data)} samples, {rate:.1f} Hz, "
+              f"sample spacing {percentiles(intervals)}")
+    # Time from raising the flag to the generation of the first logged sample
+    print(f"  logging start latency {percentiles(start_latencies)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of main.py against a simulated sensor and PLC")
+    parser.add_argument('--sensor-rate', type=float, default=1000.0, help="Fake sensor streaming rate in Hz (default 1000)")
+    parser.add_argument('--on', type=float, default=3.0, help="Seconds each logging cycle lasts (default 3)")
+    parser.add_argument('--off', type=float, default=1.0, help="Seconds between logging cycles (default 1)")
+    parser.add_argument('--cycles', type=int, default=3, help="Number of logging cycles (default 3)")
+    parser.add_argument('--sensors', type=int, default=1, metavar='N',
+                        help="Number of fake sensors, on 127.0.0.1 to 127.0.0.N (default 1)")
+    parser.add_argument('--plc-outage', type=float, default=0, metavar='SEC',
+                        help="Drop the PLC connection for SEC seconds in the middle of the first cycle")
+    parser.add_argument('--keep-logs', action='store_true', help="Keep the session logs and print where they are")
+    parser.add_argument('main_args', nargs=argparse.REMAINDER,
+                        help="Options passed to main.py after '--', e.g. -- --stream --decimate 40")
+    args = parser.parse_args()
+    main_args = [a for a in args.main_args if a != '--']
+
+    # Every fake sensor listens on the NetFT port of its own loopback address
+    sensor_hosts = [f'127.0.0.{i + 1}' for i in range(args.sensors)]
+    sensors = [FakeNetFT(host, rate=args.sensor_rate) for host in sensor_hosts]
+    sensor = sensors[0]  # The one sending to the PLC and, with several, logged to the *_s1 files
+    plc = FakePLC(on_time=args.on, off_time=args.off, cycles=args.cycles)
+    log_dir = tempfile.mkdtemp(prefix='benchmark_logs_')
+    for s in sensors:
+        s.start()
+    plc.start()
+    if args.plc_outage:
+        def outage():
+            plc.connected.wait()
+            time.sleep(args.off + args.on / 2)
+            plc.outage(args.plc_outage)
+        threading.Thread(target=outage, daemon=True).start()
+    try:
+        timeout = 30 + args.cycles * (args.on + args.off)
+        output = run_main(sensor_hosts, plc, log_dir, main_args, timeout)
+    finally:
+        plc.stop()
+        for s in sensors:
+            s.stop()
+
+    print("=== main.py output (tail)")
+    print('\n'.join(line for line in output.splitlines() if 'Data saved' not in line)[-3000:])
+    print("=== Benchmark")
+    print(f"main.py {' '.join(main_args) or '(defaults)'}")
+    streaming = '--stream' in main_args
+    rate = float(main_args[main_args.index('--rate') + 1]) if '--rate' in main_args else 100.0
+    for host, s in zip(sensor_hosts, sensors):
+        print(f"Sensor {host}: {s.sequence} records sent, {len(s.request_times)} requests")
+        if not streaming and len(s.request_times) > 2:
+            period_stats('  sensor polling', s.request_times[1:], rate).report()  # Skip the nula read
+    batched = '--plc-frame' in main_args and main_args[main_args.index('--plc-frame') + 1] == 'batch'
+    report_plc(sensor, plc, batched)
+    if plc.outages:
+        print(f"  {len(plc.outages)} outages of {args.plc_outage:.1f} s, {plc.connections} connections accepted")
+    combined = '--log-layout' in main_args and main_args[main_args.index('--log-layout') + 1] == 'combined'
+    report_logging(sensor, plc, log_dir, '_s1' if len(sensors) > 1 and not combined else '')
+
+    if args.keep_logs:
+        print(f"Logs kept in {log_dir}")
+    else:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import csv
+import os
+import struct
+import time
+import numpy as np
+
+# Binary log layout: a 64-byte header followed by fixed-width little-endian records of
+# (time float64, force float32 or float64). Records are only ever appended, and the
+# number of records follows from the file size, so a log cut short by a crash stays readable.
+MAGIC = b'NFTLOG\x00\x01'
+VERSION = 1
+HEADER = struct.Struct('<8sHcxddd')  # magic, version, force type code, nula, rate, start time
+HEADER_SIZE = 64
+BIN_EXTENSION = '.bin'
+
+def record_dtype(force_type='f'):
+    """NumPy dtype of one record for the given force type code ('f' float32 or 'd' float64)."""
+    return np.dtype([('time', '<f8'), ('force', '<f4' if force_type == 'f' else '<f8')])
+
+class BinLogWriter:
+    """Appends (time, force) rows to an open binary file; same writerows call as csv.writer."""
+
+    def __init__(self, file, nula=0.0, rate=0.0, start_time=None, force_type='f'):
+        self.file = file
+        self._record = struct.Struct('<d' + force_type)
+        if start_time is None:
+            start_time = time.time()
+        header = HEADER.pack(MAGIC, VERSION, force_type.encode(), nula, rate, start_time)
+        file.write(header.ljust(HEADER_SIZE, b'\x00'))
+
+    def writerows(self, rows):
+        pack = self._record.pack
+        self.file.write(b''.join([pack(t, f) for t, f in rows]))
+
+def _unpack_header(raw, source):
+    if len(raw) < HEADER.size or raw[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{source} is not a binary force log")
+    _, version, force_type, nula, rate, start_time = HEADER.unpack_from(raw)
+    return {'version': version, 'force_type': force_type.decode(), 'nula': nula,
+            'rate': rate, 'start_time': start_time}
+
+def read_header(file_path):
+    """Read the header of a binary log and return it as a dict."""
+    with open(file_path, 'rb') as file:
+        raw = file.read(HEADER_SIZE)
+    return _unpack_header(raw, file_path)
+
+def open_binlog(file_path):
+    """Map a binary log into memory without parsing it.
+
+    Returns the header dict and a read-only structured array with 'time' and 'force'
+    fields; both fields are views into the file.
+    """
+    header = read_header(file_path)
+    dtype = record_dtype(header['force_type'])
+    count = (os.path.getsize(file_path) - HEADER_SIZE) // dtype.itemsize  # Ignore a partial last record
+    if count == 0:
+        return header, np.zeros(0, dtype=dtype)
+    records = np.memmap(file_path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+    return header, records
+
+def parse_binlog_bytes(raw, source=''):
+    """Like open_binlog, for a whole binary log already read into memory (e.g. decompressed)."""
+    header = _unpack_header(raw, source)
+    dtype = record_dtype(header['force_type'])
+    count = (len(raw) - HEADER_SIZE) // dtype.itemsize
+    return header, np.frombuffer(raw, dtype=dtype, count=max(count, 0), offset=HEADER_SIZE)
+
+def load_binlog_data(file_path):
+    """Loads time and force data from a binary log and returns two arrays."""
+    _, records = open_binlog(file_path)
+    return records['time'], records['force']
+
+def csv_to_binlog(csv_path, bin_path=None, nula=0.0, rate=0.0, force_type='d'):
+    """Convert a Time/Force CSV log to the binary format. Returns the new file path."""
+    if bin_path is None:
+        bin_path = os.path.splitext(csv_path)[0] + BIN_EXTENSION
+    with open(csv_path, mode='r', newline='') as file:
+        csv_reader = csv.reader(file)
+        next(csv_reader)  # Skip header
+        rows = [(float(row[0]), float(row[1])) for row in csv_reader if len(row) > 1]
+    with open(bin_path, 'wb') as file:
+        # The CSV does not store its start time, the file modification time is the closest guess
+        writer = BinLogWriter(file, nula, rate, os.path.getmtime(csv_path), force_type)
+        writer.writerows(rows)
+    return bin_path
+
+def binlog_to_csv(bin_path, csv_path=None):
+    """Convert a binary log back to a Time/Force CSV. Returns the new file path."""
+    if csv_path is None:
+        csv_path = os.path.splitext(bin_path)[0] + '.csv'
+    time_data, force_data = load_binlog_data(bin_path)
+    with open(csv_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Time', 'Force (N)'])
+        writer.writerows(zip(time_data.tolist(), force_data.tolist()))
+    return csv_path
+
+def main():
+    """Convert logs between CSV and the binary format."""
+    parser = argparse.ArgumentParser(description="Convert force logs between CSV and binary format")
+    parser.add_argument('direction', choices=['to-bin', 'to-csv'], help="Conversion direction")
+    parser.add_argument('files', nargs='+', help="Files to convert")
+    parser.add_argument('--float32', action='store_true', help="Store force as float32 (half the size, ~7 significant digits)")
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        if args.direction == 'to-bin':
+            new_path = csv_to_binlog(file_path, force_type='f' if args.float32 else 'd')
+        else:
+            new_path = binlog_to_csv(file_path)
+        print(f"{file_path} -> {new_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+from loader import session_files
+
+# Every log folder has its own catalog, so it moves together with the logs it describes
+CATALOG_NAME = 'catalog.sqlite'
+
+COLUMNS = ['file', 'file_size', 'file_mtime', 'started_at', 'samples', 'duration', 'rate',
+           'nula', 'min', 'max', 'mean', 'peak_time']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    file TEXT PRIMARY KEY,  -- file name inside the folder (first chunk of a rotated session)
+    file_size INTEGER,      -- summed over every chunk of a rotated session
+    file_mtime INTEGER,     -- st_mtime_ns, of the newest chunk; with file_size it tells whether the entry is still valid
+    started_at REAL,        -- wall-clock start of the session (epoch seconds), if known
+    samples INTEGER,
+    duration REAL,
+    rate REAL,              -- achieved sample rate in Hz
+    nula REAL,              -- zero value of the session, unknown for rescanned files
+    min REAL,
+    max REAL,
+    mean REAL,
+    peak_time REAL
+)
+'''
+
+def catalog_path_for(folder):
+    return os.path.join(folder, CATALOG_NAME)
+
+def connect(folder):
+    """Open (and create if needed) the catalog of a log folder."""
+    connection = sqlite3.connect(catalog_path_for(folder), timeout=10)
+    connection.execute(SCHEMA)
+    return connection
+
+def achieved_rate(stats):
+    """Sample rate in Hz implied by a ForceSummary dict, or None if it cannot be computed."""
+    if stats['samples'] > 1 and stats['duration']:
+        return (stats['samples'] - 1) / stats['duration']
+    return None
+
+def session_key(file_path):
+    """(size, mtime) of a log; of a rotated session, the total size and the newest mtime of its chunks.
+
+    A session that gets another chunk, or a chunk that is written to or compressed, changes it.
+    """
+    stats = [os.stat(path) for path in session_files(file_path)]
+    return sum(st.st_size for st in stats), max(st.st_mtime_ns for st in stats)
+
+def record_session(file_path, stats, nula=None, started_at=None, key=None):
+    """Store the statistics of a closed log file (a ForceSummary dict) in its folder's catalog.
+
+    key is the session_key() taken before the statistics were read; by default it is taken now.
+    """
+    folder, name = os.path.split(os.path.abspath(file_path))
+    size, mtime = key if key is not None else session_key(file_path)
+    row = {
+        'file': name, 'file_size': size, 'file_mtime': mtime,
+        'started_at': started_at, 'rate': achieved_rate(stats), 'nula': nula,
+        **{key: stats[key] for key in ('samples', 'duration', 'min', 'max', 'mean', 'peak_time')},
+    }
+    connection = connect(folder)
+    try:
+        with connection:
+            connection.execute(
+                f"INSERT OR REPLACE INTO sessions ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in COLUMNS)})", row)
+    finally:
+        connection.close()
+
+def lookup(folder, file_names):
+    """Return {file name: row dict} for catalogued files (or sessions) whose size and mtime still match."""
+    if not os.path.exists(catalog_path_for(folder)):
+        return {}
+    connection = connect(folder)
+    try:
+        connection.row_factory = sqlite3.Row
+        rows = {row['file']: dict(row) for row in connection.execute("SELECT * FROM sessions")}
+    finally:
+        connection.close()
+    result = {}
+    for name in file_names:
+        row = rows.get(name)
+        if row is None:
+            continue
+        try:
+            key = session_key(os.path.join(folder, name))
+        except OSError:
+            continue
+        if (row['file_size'], row['file_mtime']) == key:
+            result[name] = row
+    return result
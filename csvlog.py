@@ -2,7 +2,19 @@ import argparse
 import time
 import NetFT
 import csv
+import gzip
 import os
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import catalog
+import metrics
+from acquisition import Acquisition, SensorGroup, compute_z_force
+from binlog import BIN_EXTENSION, BinLogWriter
+from loader import CACHE_SUFFIX, GZIP_EXTENSION
+from scheduler import PeriodStats
+from summary import ForceSummary
 
 DEFAULT_IP_ADDRESS = '192.168.1.1'
 BASE_CSV_DIR = r'C:\Users\Ivan\Desktop\data logging'
@@ -12,39 +24,231 @@ def initialize_sensor(ip_address):
     sensor = NetFT.Sensor(ip_address)
     return sensor
 
-def get_unique_csv_file_path(base_dir):
-    """Generate a unique CSV file path with a timestamp."""
+def get_unique_csv_file_path(base_dir, extension='.csv', suffix=''):
+    """Generate a unique log file path with a timestamp; suffix tells the sensors of one session apart."""
     timestamp = time.strftime("%Y%m%d_%H%M%S")
-    return os.path.join(base_dir, f'output_{timestamp}.csv')
+    path = os.path.join(base_dir, f'output_{timestamp}{suffix}{extension}')
+    counter = 1
+    while os.path.exists(path) or os.path.exists(path + GZIP_EXTENSION):  # Sessions started within the same second
+        path = os.path.join(base_dir, f'output_{timestamp}_{counter}{suffix}{extension}')
+        counter += 1
+    return path
 
-def process_sensor_data(sensor, nula):
-    """Continuously process sensor data and write to CSV."""
-    csv_file_path = get_unique_csv_file_path(BASE_CSV_DIR)
-    print(f"Logging data to {csv_file_path}")
+class FlushPolicy:
+    """When the log writer flushes the file: every N samples and/or every T ms, fsync at stop."""
 
-    with open(csv_file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
+    def __init__(self, every_samples=0, every_ms=200, fsync_on_stop=True):
+        self.every_samples = every_samples  # 0 disables the sample-count trigger
+        self.every_ms = every_ms  # 0 disables the time trigger
+        self.fsync_on_stop = fsync_on_stop
+
+    def due(self, pending, since_flush):
+        """Return True if pending unflushed samples written since_flush seconds ago should be flushed."""
+        if pending == 0:
+            return False
+        if self.every_samples and pending >= self.every_samples:
+            return True
+        return bool(self.every_ms) and since_flush * 1000 >= self.every_ms
+
+class RotationPolicy:
+    """When a session log continues in a new chunk file: every N megabytes and/or every T minutes.
+
+    Finished chunks are gzip-compressed in the background unless compress is False.
+    """
+
+    def __init__(self, max_mb=0, max_minutes=0, compress=True):
+        self.max_bytes = max_mb * 1000000  # 0 disables the size trigger
+        self.max_seconds = max_minutes * 60  # 0 disables the time trigger
+        self.compress = compress
+
+    def due(self, size, age):
+        """Return True if a chunk of size bytes, opened age seconds ago, should be closed."""
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.max_seconds) and age >= self.max_seconds
+
+def compress_file(path):
+    """gzip a finished log file to path + .gz and remove the original.
+
+    The .gz file only appears, under its final name, once it is complete, so a reader
+    never sees a partial chunk.
+    """
+    tmp_path = path + GZIP_EXTENSION + '.tmp'
+    try:
+        with open(path, 'rb') as source, gzip.open(tmp_path, 'wb', compresslevel=6) as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        os.replace(tmp_path, path + GZIP_EXTENSION)
+        os.remove(path)
+        if os.path.exists(path + CACHE_SUFFIX):
+            os.remove(path + CACHE_SUFFIX)
+    except OSError as e:
+        print(f"Could not compress {path}: {e}")
+
+# One background thread compresses the finished chunks of all sessions, one after the
+# other; zlib releases the GIL, so the writers keep running. Queued chunks are still
+# compressed when the program exits.
+_compressor = None
+
+def compress_in_background(path):
+    global _compressor
+    if _compressor is None:
+        _compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='compress')
+    return _compressor.submit(compress_file, path)
+
+def open_log_writer(log_format, nula, rate, base_dir=BASE_CSV_DIR, sensors=1, suffix='', path=None):
+    """Create a new session file and return it with a writer that has writerows.
+
+    With sensors > 1 the CSV has one force column per sensor; the binary format only
+    holds a single force column. path overrides the generated file name.
+    """
+    if log_format == 'bin':
+        if sensors > 1:
+            raise ValueError("Binary logs hold a single sensor; use CSV or one log per sensor")
+        file = open(path or get_unique_csv_file_path(base_dir, BIN_EXTENSION, suffix), mode='wb', buffering=1 << 16)
+        return file, BinLogWriter(file, nula, rate)
+    file = open(path or get_unique_csv_file_path(base_dir, suffix=suffix), mode='a', newline='', buffering=1 << 16)
+    writer = csv.writer(file)
+    if sensors > 1:
+        writer.writerow(['Time'] + [f'Force {i + 1} (N)' for i in range(sensors)])
+    else:
         writer.writerow(['Time', 'Force (N)'])  # Write header if needed
+    return file, writer
+
+class RotatingLog:
+    """Session log written as numbered chunk files, output_<time>.part001.csv and so on.
+
+    Stands in for the (file, writer) pair of open_log_writer: every chunk is a complete
+    log with its own header, and writerows moves on to the next chunk when the policy
+    says so. Chunks are fsynced when closed and then handed to the compressor.
+    """
+
+    def __init__(self, policy, log_format, nula, rate, base_dir, sensors=1, suffix=''):
+        self.policy = policy
+        self._extension = BIN_EXTENSION if log_format == 'bin' else '.csv'
+        self.name = get_unique_csv_file_path(base_dir, '.part001' + self._extension, suffix)
+        self._base = self.name[:-len('.part001' + self._extension)]
+        self._open_args = (log_format, nula, rate, base_dir, sensors)
+        self.index = 0
+        self._open_next()
+
+    def _open_next(self):
+        self.index += 1
+        path = f'{self._base}.part{self.index:03d}{self._extension}'
+        self.file, self.writer = open_log_writer(*self._open_args, path=path)
+        self._raw = getattr(self.file, 'buffer', self.file)  # Its tell() does not flush
+        self._opened = time.monotonic()
+
+    def _close_chunk(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        if self.policy.compress:
+            compress_in_background(self.file.name)
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+        if self.policy.due(self._raw.tell(), time.monotonic() - self._opened):
+            self._close_chunk()
+            self._open_next()
+            print(f"Logging continues in {self.file.name}")
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
 
-        start_time = time.time()  # Start the timer for the logging session
+    def close(self):
+        if not self.file.closed:
+            self._close_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def process_sensor_data(subscription, nula, stop_event=None, start_time=None,
+                        flush_policy=None, print_interval=0.5, log_format='csv', rate=0.0,
+                        base_dir=None, suffix='', rotation=None):
+    """Write samples from an acquisition subscription to a log file until stop_event is set.
+
+    Samples are taken from the subscription in batches and written with writerows, and
+    the file is flushed according to flush_policy. At most one value is printed every
+    print_interval seconds, so a slow disk or terminal only delays this thread and never
+    the acquisition. log_format is 'csv' or 'bin' (see binlog.py); rate is only stored
+    in the binary header. Summary statistics are accumulated while recording and stored
+    in the folder's catalog (see catalog.py) when the file is closed. Files go to
+    base_dir, BASE_CSV_DIR by default; suffix is added to the file name and the metric names.
+
+    For a multi-column log, subscription is a SampleAligner and nula a list with the
+    zero value of every sensor; the summary and the catalog then describe the first
+    sensor, the one the plot and statistics scripts read.
+
+    With a RotationPolicy the session is split into chunk files (see RotatingLog); such
+    a session is catalogued by ar_sredina.py once it is complete.
+    """
+    if flush_policy is None:
+        flush_policy = FlushPolicy()
+    sensors = len(nula) if isinstance(nula, (list, tuple)) else 1
+    if rotation is not None:
+        file = writer = RotatingLog(rotation, log_format, nula, rate, base_dir or BASE_CSV_DIR, sensors, suffix)
+    else:
+        file, writer = open_log_writer(log_format, nula, rate, base_dir or BASE_CSV_DIR, sensors, suffix)
+    print(f"Logging data to {file.name}")
+
+    with file:
+        if start_time is None:
+            start_time = time.monotonic()  # Start the timer for the logging session
+        sample_stats = PeriodStats('Logged samples')  # Spacing of the elapsed_time column
+        session_summary = ForceSummary()
+        pending = 0  # Rows written since the last flush
+        last_flush = last_print = time.monotonic()
+        m = metrics.get()
+        if m is not None:
+            m.gauge('log_dropped' + suffix, lambda: subscription.dropped)  # Of the current session
 
         try:
             while True:
-                sensor.getForce()  # Ensure the sensor is updated
-                sensor_data = sensor.force()
-                if len(sensor_data) > 2:  # Check if force data is valid
-                    # Calculate the time elapsed since the start of logging
-                    elapsed_time = time.time() - start_time
-                    Z_sila = (nula - sensor_data[2]) / 1000000
-                    writer.writerow([elapsed_time, Z_sila])
-                    print(f"Data saved: {Z_sila}")
-                    
-                    # Flush the data to the file periodically
-                    file.flush()
+                stopping = stop_event is not None and stop_event.is_set()
+                # Once stopping, only drain the samples that are already buffered
+                batch = subscription.get_batch(4096, timeout=0 if stopping else 0.1)
+                if not batch and (stopping or subscription.closed):
+                    break
+
+                # Time elapsed since the start of logging and the force in newtons
+                times = [sample.time - start_time for sample in batch]
+                if sensors > 1:
+                    columns = [[compute_z_force(n, sample.data[i]) for sample in batch]
+                               for i, n in enumerate(nula)]
+                    forces = columns[0]
+                    rows = zip(times, *columns)
                 else:
-                    print("Error: Sensor data invalid, force array too short")
+                    forces = [compute_z_force(nula, sample.data) for sample in batch]
+                    rows = zip(times, forces)
+                for sample in batch:
+                    sample_stats.mark(sample.time)
+                if m is not None:
+                    t0 = time.perf_counter_ns()
+                writer.writerows(rows)
+                if m is not None:
+                    m.observe('log_write' + suffix, time.perf_counter_ns() - t0)
+                    m.count('logged' + suffix, len(batch))
+                session_summary.update(times, forces)
+                pending += len(batch)
 
-                time.sleep(0.01)  # 100 Hz frequency (0.01s per sample)
+                now = time.monotonic()
+                if flush_policy.due(pending, now - last_flush):
+                    if m is not None:
+                        t0 = time.perf_counter_ns()
+                    file.flush()
+                    if m is not None:
+                        m.observe('log_flush' + suffix, time.perf_counter_ns() - t0)
+                    pending = 0
+                    last_flush = now
+                if forces and now - last_print >= print_interval:
+                    print(f"Data saved: {forces[-1]}")
+                    last_print = now
 
         except KeyboardInterrupt:
             print("Exiting due to user interrupt")
@@ -52,24 +256,130 @@ def process_sensor_data(sensor, nula):
             print("Cleaning up...")
             # Ensure that all data is flushed to the file
             file.flush()
-            os.fsync(file.fileno())  # Ensure data is written to disk
+            if flush_policy.fsync_on_stop:
+                os.fsync(file.fileno())  # Ensure data is written to disk
+            if subscription.dropped:
+                print(f"Warning: writer fell behind, {subscription.dropped} samples were dropped")
+            sample_stats.report()
+
+    if rotation is not None:
+        return  # The chunks are still being compressed
+    try:
+        started_at = time.time() - (time.monotonic() - start_time)  # Wall-clock start of the session
+        catalog.record_session(file.name, session_summary.as_dict(), nula[0] if sensors > 1 else nula, started_at)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Could not update the session catalog: {e}")
+
+class CsvLogger:
+    """In-process logging engine that records samples from a running Acquisition.
+
+    Given a SensorGroup it records one multi-column log of all its sensors.
+    """
+
+    def __init__(self, acquisition, flush_policy=None, log_format='csv', base_dir=None, suffix='',
+                 rotation=None):
+        self.acquisition = acquisition
+        self.flush_policy = flush_policy
+        self.rotation = rotation
+        self.log_format = log_format
+        self.base_dir = base_dir
+        self.suffix = suffix
+        self._thread = None
+        self._stop_event = None
+
+    @property
+    def active(self):
+        return self._thread is not None
+
+    def start(self, nula, start_time=None):
+        """Start recording. Samples are captured from this call on; the file is opened in the background.
+
+        Loggers of several sensors started with the same start_time share the time axis.
+        """
+        if self.active:
+            return
+        subscription = self.acquisition.subscribe()
+        if start_time is None:
+            start_time = time.monotonic()
+        self._stop_event = threading.Event()
+        rate = 0.0 if self.acquisition.streaming else self.acquisition.rate  # 0 = sensor rate, unknown here
+        self._thread = threading.Thread(target=process_sensor_data,
+                                        args=(subscription, nula, self._stop_event, start_time,
+                                              self.flush_policy),
+                                        kwargs={'log_format': self.log_format, 'rate': rate,
+                                                'base_dir': self.base_dir, 'suffix': self.suffix,
+                                                'rotation': self.rotation})
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop recording, write the buffered samples and fsync the file."""
+        if not self.active:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
 
 def main():
     """Main function to parse arguments and start data processing."""
     parser = argparse.ArgumentParser(description="CSV Logging Script")
-    parser.add_argument('-n', '--nula', type=float, required=True, help="Zero value for force calculation")
+    parser.add_argument('-n', '--nula', type=float, nargs='+', required=True,
+                        help="Zero value for force calculation, one per sensor")
+    parser.add_argument('--ip', nargs='+', default=[DEFAULT_IP_ADDRESS],
+                        help=f"Sensor IP addresses (default {DEFAULT_IP_ADDRESS})")
+    parser.add_argument('--combined', action='store_true',
+                        help="Log several sensors to one multi-column CSV instead of one log per sensor")
+    parser.add_argument('-s', '--stream', action='store_true', help="Log at the full RDT streaming rate instead of 100 Hz")
+    parser.add_argument('--flush-every', type=int, default=0, metavar='N', help="Flush the file every N samples")
+    parser.add_argument('--flush-ms', type=float, default=200, metavar='T', help="Flush the file every T milliseconds (default 200)")
+    parser.add_argument('--format', choices=['csv', 'bin'], default='csv', help="Log file format (default csv)")
+    parser.add_argument('--log-dir', default=BASE_CSV_DIR, help="Folder for the log files")
+    parser.add_argument('--rotate-mb', type=float, default=0, metavar='MB', help="Continue in a new chunk file every MB megabytes")
+    parser.add_argument('--rotate-min', type=float, default=0, metavar='MIN', help="Continue in a new chunk file every MIN minutes")
+    parser.add_argument('--no-compress', action='store_true', help="Keep finished chunks uncompressed")
     args = parser.parse_args()
+    if len(args.nula) != len(args.ip):
+        parser.error("give one --nula value per sensor")
+    if args.combined and args.format == 'bin':
+        parser.error("--combined needs the csv format")
 
-    # Use the default IP address
-    sensor = initialize_sensor(DEFAULT_IP_ADDRESS)
-    nula = args.nula
-
+    # 100 Hz frequency (0.01s per sample) when polling, full sensor rate when streaming
+    multiple = len(args.ip) > 1
+    acquisitions = [Acquisition(initialize_sensor(ip), rate=100.0, capacity=65536 if args.stream else 4096,
+                                streaming=args.stream, name=f'Sensor {i + 1} ({ip})' if multiple else 'Acquisition',
+                                metric_suffix=f'_s{i + 1}' if multiple else '')
+                    for i, ip in enumerate(args.ip)]
+    for acquisition in acquisitions:
+        acquisition.start()
     try:
-        process_sensor_data(sensor, nula)
+        flush_policy = FlushPolicy(every_samples=args.flush_every, every_ms=args.flush_ms)
+        rotation = None
+        if args.rotate_mb or args.rotate_min:
+            rotation = RotationPolicy(args.rotate_mb, args.rotate_min, compress=not args.no_compress)
+        rate = 0.0 if args.stream else acquisitions[0].rate
+        if args.combined and multiple:
+            process_sensor_data(SensorGroup(acquisitions).subscribe(), args.nula, flush_policy=flush_policy,
+                                log_format=args.format, rate=rate, base_dir=args.log_dir, rotation=rotation)
+        else:
+            # One logger thread per sensor, all on the same time axis
+            loggers = [CsvLogger(acquisition, flush_policy, args.format, args.log_dir,
+                                 suffix=f'_s{i + 1}' if multiple else '', rotation=rotation)
+                       for i, acquisition in enumerate(acquisitions)]
+            start_time = time.monotonic()
+            for logger, nula in zip(loggers, args.nula):
+                logger.start(nula, start_time)
+            try:
+                while not all(acquisition.ring.closed for acquisition in acquisitions):
+                    time.sleep(0.5)
+            finally:
+                for logger in loggers:
+                    logger.stop()
     except KeyboardInterrupt:
         print("Exiting due to user interrupt")
     finally:
         print("Cleaning up...")
+        for acquisition in acquisitions:
+            acquisition.stop()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,58 @@
+import numpy as np
+
+def minmax_downsample(x, y, n_bins, x_range=None):
+    """Peak-preserving downsampling of a time series for plotting.
+
+    The samples inside x_range (all samples if None) are split into n_bins bins of equal
+    sample count and only the minimum and the maximum of every bin are kept, in time
+    order. With one bin per pixel column the drawn line looks the same as the full data,
+    every force peak included, while at most 2 * n_bins + 2 points are drawn. x must be
+    sorted. One sample on each side of x_range is kept so the line reaches the edges.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    start, stop = 0, len(x)
+    if x_range is not None:
+        start = max(0, int(np.searchsorted(x, x_range[0], side='left')) - 1)
+        stop = min(len(x), int(np.searchsorted(x, x_range[1], side='right')) + 1)
+    n_bins = max(1, int(n_bins))
+    count = stop - start
+    if count <= 2 * n_bins:
+        return x[start:stop], y[start:stop]
+
+    bin_size = count // n_bins
+    end = start + bin_size * n_bins
+    bins = y[start:end].reshape(n_bins, bin_size)
+    offsets = start + np.arange(n_bins) * bin_size
+    indices = [np.argmin(bins, axis=1) + offsets, np.argmax(bins, axis=1) + offsets]
+    if end < stop:  # Samples left over after the equal bins form one more bin
+        indices.append(np.array([start + bin_size * n_bins + np.argmin(y[end:stop]),
+                                 start + bin_size * n_bins + np.argmax(y[end:stop])]))
+    indices = np.concatenate(indices + [[start, stop - 1]])
+    indices = np.unique(indices)  # Sorted, so min and max of a bin stay in time order
+    return x[indices], y[indices]
+
+class LodLine:
+    """A plotted line that is redrawn from the full-resolution data on every zoom or pan.
+
+    Only a min/max-downsampled view sized to the pixel width of the axes is handed to
+    matplotlib, so drawing cost does not grow with the number of samples.
+    """
+
+    def __init__(self, ax, x, y, **plot_kwargs):
+        self.ax = ax
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        xs, ys = minmax_downsample(self.x, self.y, self._pixel_width())
+        self.line, = ax.plot(xs, ys, **plot_kwargs)
+        # A plain function is held strongly by the callback registry, unlike a bound method
+        ax.callbacks.connect('xlim_changed', lambda ax: self.update())
+
+    def _pixel_width(self):
+        return max(1, int(self.ax.bbox.width))
+
+    def update(self):
+        """Recompute the drawn points for the current x limits and axes size."""
+        xs, ys = minmax_downsample(self.x, self.y, self._pixel_width(), self.ax.get_xlim())
+        self.line.set_data(xs, ys)
+        self.ax.figure.canvas.draw_idle()
@@ -0,0 +1,100 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from acquisition import compute_z_force
+from downsample import minmax_downsample
+
+class RollingBuffer:
+    """Fixed-size circular buffer of (time, value) pairs; the oldest pairs are overwritten."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._time = np.zeros(capacity)
+        self._value = np.zeros(capacity)
+        self._pos = 0
+        self.count = 0
+
+    def extend(self, times, values):
+        times = np.asarray(times, dtype=np.float64)[-self.capacity:]
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        n = len(times)
+        first = min(n, self.capacity - self._pos)  # Part that fits before the end of the arrays
+        self._time[self._pos:self._pos + first] = times[:first]
+        self._value[self._pos:self._pos + first] = values[:first]
+        self._time[:n - first] = times[first:]
+        self._value[:n - first] = values[first:]
+        self._pos = (self._pos + n) % self.capacity
+        self.count = min(self.capacity, self.count + n)
+
+    def ordered(self):
+        """Return the buffered times and values in chronological order."""
+        if self.count < self.capacity:
+            return self._time[:self.count], self._value[:self.count]
+        return (np.concatenate((self._time[self._pos:], self._time[:self._pos])),
+                np.concatenate((self._value[self._pos:], self._value[:self._pos])))
+
+class LivePlot:
+    """Scrolling force plot fed from an acquisition subscription.
+
+    Redraws on a GUI timer capped at fps frames per second, whatever the sample rate.
+    Every frame takes whatever samples arrived since the last one without waiting, so a
+    slow frame only means fewer frames; the acquisition ring drops the oldest samples
+    for this reader rather than ever waiting for it. Only the line is redrawn each frame
+    (blitting) and it is min/max-downsampled to the axes width.
+    """
+
+    def __init__(self, subscription, nula, window=10.0, fps=20, capacity=100000):
+        self.subscription = subscription
+        self.nula = nula
+        self.window = window
+        self.fps = fps
+        self.buffer = RollingBuffer(capacity)
+        self._background = None
+        self.frames = 0
+
+    def run(self):
+        """Open the window and block until it is closed. Must be called from the main thread."""
+        self.fig, self.ax = plt.subplots(figsize=(10, 4))
+        self.ax.set_xlim(-self.window, 0)
+        self.ax.set_ylim(-1, 1)
+        self.ax.set_xlabel('Vrijeme, s')
+        self.ax.set_ylabel('Aksijalna sila, N')
+        self.ax.grid(True)
+        self.line, = self.ax.plot([], [], color='b', animated=True)
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+        self._timer = self.fig.canvas.new_timer(interval=int(1000 / self.fps))
+        self._timer.add_callback(self._on_timer)
+        self._timer.start()
+        plt.show()
+        self._timer.stop()
+
+    def _on_draw(self, event):
+        # Full redraw (start, resize, new y limits): keep the static part for blitting
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.ax.draw_artist(self.line)
+
+    def _on_timer(self):
+        batch = self.subscription.get_batch(self.buffer.capacity, timeout=0)
+        if not batch or self._background is None:
+            return
+        nula = self.nula
+        self.buffer.extend([s.time for s in batch], [compute_z_force(nula, s.data) for s in batch])
+
+        times, forces = self.buffer.ordered()
+        now = times[-1]
+        xs, ys = minmax_downsample(times - now, forces, self.ax.bbox.width, (-self.window, 0))
+        self.line.set_data(xs, ys)
+
+        low, high = self.ax.get_ylim()
+        if len(ys) and (ys.min() < low or ys.max() > high):
+            # Grow the y range with some margin; this needs one full redraw
+            margin = 0.1 * (ys.max() - ys.min() or 1.0)
+            self.ax.set_ylim(min(low, ys.min() - margin), max(high, ys.max() + margin))
+            self.fig.canvas.draw_idle()
+            return
+
+        canvas = self.fig.canvas
+        canvas.restore_region(self._background)
+        self.ax.draw_artist(self.line)
+        canvas.blit(self.ax.bbox)
+        self.frames += 1
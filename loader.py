@@ -0,0 +1,182 @@
+import gzip
+import io
+import os
+import re
+import warnings
+import numpy as np
+from binlog import BIN_EXTENSION, load_binlog_data, parse_binlog_bytes
+
+CACHE_SUFFIX = '.cache.npz'
+GZIP_EXTENSION = '.gz'
+LOG_EXTENSIONS = ('.csv', BIN_EXTENSION, '.csv' + GZIP_EXTENSION, BIN_EXTENSION + GZIP_EXTENSION)
+
+# Rotated sessions are split into numbered chunks, output_<time>.part001.csv and so on,
+# each gzip-compressed (.gz) once it is complete
+CHUNK_PATTERN = re.compile(r'^(.*)\.part(\d+)(\.csv|\.bin)(\.gz)?$')
+
+def is_log_file(file_path):
+    return file_path.endswith(LOG_EXTENSIONS)
+
+def session_files(file_path):
+    """The chunk files of the rotated session file_path belongs to, in order; [file_path] otherwise."""
+    match = CHUNK_PATTERN.match(file_path)
+    if match is None:
+        return [file_path]
+    base, extension = match.group(1), match.group(3)
+    folder = os.path.dirname(file_path)
+    chunks = {}
+    for name in os.listdir(folder or '.'):
+        path = os.path.join(folder, name)
+        m = CHUNK_PATTERN.match(path)
+        if m is None or m.group(1) != base or m.group(3) != extension:
+            continue
+        index = int(m.group(2))
+        # While a chunk is being compressed both files exist; the .gz only appears once it is
+        # complete, and the uncompressed one is deleted right after
+        if index not in chunks or m.group(4):
+            chunks[index] = path
+    return [chunks[i] for i in sorted(chunks)] or [file_path]
+
+def list_sessions(file_paths):
+    """Keep one path per rotated session (its first chunk in the given order), keeping the order."""
+    seen = set()
+    sessions = []
+    for path in file_paths:
+        match = CHUNK_PATTERN.match(path)
+        key = (match.group(1), match.group(3)) if match else path
+        if key not in seen:
+            seen.add(key)
+            sessions.append(path)
+    return sessions
+
+def _open_raw(file_path):
+    """Open a log for binary reading, decompressing .gz files on the fly."""
+    if file_path.endswith(GZIP_EXTENSION):
+        return gzip.open(file_path, 'rb')
+    return open(file_path, 'rb')
+
+def _cache_key(file_path):
+    """Size and modification time of a file; the cache is only used while both still match."""
+    st = os.stat(file_path)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+def _read_cache(file_path, key):
+    cache_path = file_path + CACHE_SUFFIX
+    try:
+        with np.load(cache_path) as cache:
+            if np.array_equal(cache['key'], key):
+                return cache['time'], cache['force']
+    except (OSError, KeyError, ValueError):
+        pass  # No cache yet, or a stale/broken one that will be rewritten
+    return None
+
+def _write_cache(file_path, key, time_data, force_data):
+    cache_path = file_path + CACHE_SUFFIX
+    tmp_path = cache_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, key=key, time=time_data, force=force_data)
+        os.replace(tmp_path, cache_path)  # Readers never see a half-written cache
+    except OSError as e:
+        print(f"Could not write cache {cache_path}: {e}")
+
+def _parse_csv_bytes(raw, skip_header, source):
+    """Parse CSV rows held in a bytes object; see parse_csv."""
+    try:
+        # Fast path: the C parser, used for every well-formed file
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # "input contained no data" for header-only logs
+            data = np.loadtxt(io.BytesIO(raw), delimiter=',', skiprows=skip_header, usecols=(0, 1), ndmin=2)
+    except ValueError:
+        # Malformed rows: short rows are dropped by genfromtxt, bad values become NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            data = np.genfromtxt(io.BytesIO(raw), delimiter=',', skip_header=skip_header, usecols=(0, 1),
+                                 invalid_raise=False, ndmin=2)
+        if data.ndim != 2 or data.shape[1] < 2:
+            data = np.empty((0, 2))  # Nothing but short rows, e.g. a log cut off after the header
+        lines = raw.splitlines()
+        total_rows = len(lines) - skip_header - lines.count(b'')
+        data = data[~np.isnan(data).any(axis=1)]
+        print(f"Skipped {total_rows - len(data)} malformed rows in {source}")
+    if data.shape[1] < 2:
+        data = np.empty((0, 2))  # No rows at all
+    return np.ascontiguousarray(data[:, 0]), np.ascontiguousarray(data[:, 1])
+
+def parse_csv(file_path):
+    """Parse a Time/Force CSV in bulk with NumPy and return two float64 arrays.
+
+    Rows with a missing column or a value that is not a number are skipped. The file
+    may be gzip-compressed.
+    """
+    with _open_raw(file_path) as file:
+        raw = file.read()
+    return _parse_csv_bytes(raw, 1, file_path)
+
+def _parse_file(file_path):
+    if file_path.endswith(BIN_EXTENSION + GZIP_EXTENSION):
+        with gzip.open(file_path, 'rb') as file:
+            _, records = parse_binlog_bytes(file.read(), file_path)
+        return records['time'], records['force']
+    return parse_csv(file_path)
+
+def _load_file(file_path, use_cache):
+    if file_path.endswith(BIN_EXTENSION):
+        return load_binlog_data(file_path)
+    if not use_cache:
+        return _parse_file(file_path)
+    key = _cache_key(file_path)
+    cached = _read_cache(file_path, key)
+    if cached is not None:
+        return cached
+    time_data, force_data = _parse_file(file_path)
+    _write_cache(file_path, key, time_data, force_data)
+    return time_data, force_data
+
+def load_log_data(file_path, use_cache=True):
+    """Loads time and force data from a log file and returns two NumPy arrays.
+
+    Binary logs are memory-mapped. CSV and compressed logs are parsed once and then
+    stored in a sidecar cache next to the file, keyed on its size and modification
+    time, so opening the same log again skips the parsing. A chunk of a rotated
+    session loads the whole session, all chunks joined in order.
+    """
+    files = session_files(file_path)
+    if len(files) == 1:
+        return _load_file(files[0], use_cache)
+    parts = [_load_file(f, use_cache) for f in files]
+    return np.concatenate([t for t, _ in parts]), np.concatenate([f for _, f in parts])
+
+def iter_log_chunks(file_path, chunk_rows=1000000):
+    """Yield (time, force) array chunks of a log, holding at most chunk_rows rows in memory.
+
+    Used for single-pass reductions over logs that are too large to load at once. A valid
+    sidecar cache is used when there is one, but none is written. A rotated session is
+    read chunk file by chunk file.
+    """
+    for path in session_files(file_path):
+        yield from _iter_file_chunks(path, chunk_rows)
+
+def _iter_file_chunks(file_path, chunk_rows):
+    if file_path.endswith(BIN_EXTENSION):
+        time_data, force_data = load_binlog_data(file_path)
+    else:
+        cached = _read_cache(file_path, _cache_key(file_path))
+        if cached is not None:
+            time_data, force_data = cached
+        elif file_path.endswith(BIN_EXTENSION + GZIP_EXTENSION):
+            time_data, force_data = _parse_file(file_path)  # One rotation chunk at most
+        else:
+            yield from _iter_csv_chunks(file_path, chunk_rows)
+            return
+    for start in range(0, len(time_data), chunk_rows):
+        yield time_data[start:start + chunk_rows], force_data[start:start + chunk_rows]
+
+def _iter_csv_chunks(file_path, chunk_rows):
+    with _open_raw(file_path) as file:
+        file.readline()  # Skip header
+        while True:
+            lines = file.readlines(chunk_rows * 24)  # Size hint of roughly chunk_rows short rows
+            if not lines:
+                break
+            yield _parse_csv_bytes(b''.join(lines), 0, file_path)
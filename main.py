@@ -5,25 +5,34 @@ import NetFT
 import argparse
 import time
 import socket
-import struct
-import subprocess
 import threading
+import metrics
+from acquisition import Acquisition, Decimator, Sample, SampleAligner, SensorGroup, compute_z_force
+from csvlog import BASE_CSV_DIR, CsvLogger, RotationPolicy
+from plc_link import PlcLink
+from scheduler import PeriodStats
 
 # Define server address and port
 SERVER_HOST = '192.168.0.1'  # Replace with your server's host
 SERVER_PORT = 2000  # Replace with your server's port
 
-def connect_to_server():
+def connect_to_server(host=SERVER_HOST, port=SERVER_PORT, timeout=5.0):
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client_socket.connect((SERVER_HOST, SERVER_PORT))
-    print(f'Connected to server {SERVER_HOST}:{SERVER_PORT}')
+    client_socket.settimeout(timeout)  # An unreachable PLC fails the attempt instead of hanging it
+    try:
+        client_socket.connect((host, port))
+    except OSError:
+        client_socket.close()
+        raise
+    print(f'Connected to server {host}:{port}')
     return client_socket
 
 parser = argparse.ArgumentParser(description="Read data from ATI NetFT sensors.")
 parser.add_argument('ip',
                     metavar='ip address',
                     type=str,
-                    help="The IP address of the sensor")
+                    nargs='*',
+                    help="The IP address of the sensor; several addresses read several sensors")
 parser.add_argument('-t', '--torque',
                     dest='torque',
                     action='store_true',
@@ -50,16 +59,157 @@ parser.add_argument('-c', '--continuous',
                     dest='continuous',
                     action='store_true',
                     help="Print data continuously")
+parser.add_argument('--stream',
+                    dest='stream',
+                    action='store_true',
+                    help="Use high-speed RDT streaming instead of polling the sensor at 100 Hz")
+parser.add_argument('--replay',
+                    dest='replay',
+                    nargs='+',
+                    metavar='LOG',
+                    help="Play recorded logs back instead of reading sensors, one log per sensor "
+                         "(implies --stream)")
+parser.add_argument('--speed',
+                    dest='speed',
+                    type=float,
+                    default=1.0,
+                    metavar='X',
+                    help="Replay speed: 1 = as recorded (default), X times faster, 0 = as fast as possible")
+parser.add_argument('--rate',
+                    dest='rate',
+                    type=float,
+                    default=100.0,
+                    metavar='HZ',
+                    help="Sampling rate when polling the sensor (default 100 Hz)")
+parser.add_argument('--decimate',
+                    dest='decimate',
+                    type=int,
+                    default=4,
+                    metavar='N',
+                    help="Send every Nth sample to the PLC (default 4, i.e. 25 Hz when polling)")
+parser.add_argument('--average',
+                    dest='average',
+                    action='store_true',
+                    help="Send the mean of each N samples to the PLC instead of every Nth sample")
+parser.add_argument('--log-format',
+                    dest='log_format',
+                    choices=['csv', 'bin'],
+                    default='csv',
+                    help="Format of the session logs started by the PLC (default csv)")
+parser.add_argument('--log-layout',
+                    dest='log_layout',
+                    choices=['separate', 'combined'],
+                    default='separate',
+                    help="With several sensors: one log per sensor (default) or one CSV with a "
+                         "force column per sensor")
+parser.add_argument('--rotate-mb',
+                    dest='rotate_mb',
+                    type=float,
+                    default=0,
+                    metavar='MB',
+                    help="Split session logs into chunk files of MB megabytes")
+parser.add_argument('--rotate-min',
+                    dest='rotate_min',
+                    type=float,
+                    default=0,
+                    metavar='MIN',
+                    help="Split session logs into chunk files of MIN minutes")
+parser.add_argument('--no-compress',
+                    dest='no_compress',
+                    action='store_true',
+                    help="Keep finished chunk files uncompressed (default: gzip in the background)")
+parser.add_argument('--live',
+                    dest='live',
+                    action='store_true',
+                    help="Show a live scrolling force plot; closing the window ends the run")
+parser.add_argument('--live-fps',
+                    dest='live_fps',
+                    type=float,
+                    default=20,
+                    metavar='FPS',
+                    help="Maximum redraw rate of the live plot (default 20)")
+parser.add_argument('--plc-host',
+                    dest='plc_host',
+                    default=SERVER_HOST,
+                    help=f"PLC address (default {SERVER_HOST})")
+parser.add_argument('--plc-port',
+                    dest='plc_port',
+                    type=int,
+                    default=SERVER_PORT,
+                    help=f"PLC port (default {SERVER_PORT})")
+parser.add_argument('--plc-sensors',
+                    dest='plc_sensors',
+                    type=int,
+                    nargs='+',
+                    default=[1],
+                    metavar='N',
+                    help="Sensors (1 = first ip address) whose force is sent to the PLC; with "
+                         "several, every update carries one value per sensor in this order (default 1)")
+parser.add_argument('--plc-frame',
+                    dest='plc_frame',
+                    choices=['float', 'batch'],
+                    default='float',
+                    help="Values sent as bare float32 (default) or as batched frames "
+                         "(sequence, timestamp, count, values)")
+parser.add_argument('--plc-batch',
+                    dest='plc_batch',
+                    type=int,
+                    default=32,
+                    metavar='N',
+                    help="Maximum number of values per batched frame (default 32)")
+parser.add_argument('--plc-backlog',
+                    dest='plc_backlog',
+                    type=int,
+                    default=1024,
+                    metavar='N',
+                    help="Updates (one value per --plc-sensors sensor) kept for the PLC while it "
+                         "is slow or disconnected; older ones are dropped (default 1024)")
+parser.add_argument('--log-dir',
+                    dest='log_dir',
+                    default=BASE_CSV_DIR,
+                    help="Folder for the session logs")
+parser.add_argument('--shm',
+                    dest='shm',
+                    metavar='NAME',
+                    help="Publish the live samples in shared memory NAME for other processes "
+                         "(NAME_s2, NAME_s3, ... for the other sensors), see shm_ring.py")
+parser.add_argument('--stats-interval',
+                    dest='stats_interval',
+                    type=float,
+                    default=0,
+                    metavar='SEC',
+                    help="Print per-stage latency and counter statistics every SEC seconds")
+parser.add_argument('--stats-port',
+                    dest='stats_port',
+                    type=int,
+                    default=0,
+                    metavar='PORT',
+                    help="Serve the statistics as JSON on http://127.0.0.1:PORT/")
 args = parser.parse_args()
+if args.replay:
+    args.ip = args.replay  # The logs take the place of the sensors
+    args.stream = True  # Samples come at the logged times, not at a polling rate
+elif not args.ip:
+    parser.error("give the sensor ip address (or --replay LOG)")
+if any(not 1 <= n <= len(args.ip) for n in args.plc_sensors):
+    parser.error(f"--plc-sensors must be between 1 and {len(args.ip)}")
+if args.log_layout == 'combined' and args.log_format == 'bin' and len(args.ip) > 1:
+    parser.error("--log-layout combined needs --log-format csv")
 
 args.force, args.torque = \
     args.force or not args.force and not args.torque, \
     args.torque or not args.force and not args.torque
 
-sensor = NetFT.Sensor(args.ip)
+if args.replay:
+    from replay import ReplaySensor
+    sensors = [ReplaySensor(log, args.speed) for log in args.replay]
+else:
+    sensors = [NetFT.Sensor(ip) for ip in args.ip]
+sensor = sensors[0]  # The one-shot modes read the first sensor
 
 if args.mean:
-    sensor.tare(args.mean)
+    for s in sensors:
+        s.tare(args.mean)
 
 if args.force and args.torque:
     data = sensor.measurement
@@ -71,60 +221,81 @@ else:
     data = sensor.torque
     get = sensor.getTorque
 
-def get_plc_variable_status(client_socket):
-    try:
-        data = client_socket.recv(2)  # Expecting 2 bytes of data
-        if data:
-            if data == b'\x01\x00':  # 0100 in Hex or 1 in Int
-                return True
-            elif data == b'\x00\x00':  # 0000 in Hex or 0 in Int
-                return False
-    except Exception as e:
-        print(f"Error receiving PLC status: {e}")
-    return None
-
-def send_data_to_plc(client_socket):
+def send_data_to_plc(link, subscription, nulas):
+    """Send the force of the selected sensors to the PLC.
+
+    nulas holds the zero value of every sensor sent; with several sensors subscription
+    is a SampleAligner and every update carries one value per sensor.
+    """
     global running
+    decimator = Decimator(args.decimate, average=args.average)  # Reduce to the PLC rate
+    # The PLC rate is only known in advance when polling
+    send_stats = PeriodStats('PLC send', None if args.stream else args.rate / decimator.factor)
+    m = metrics.get()
+    if m is not None:
+        m.gauge('plc_dropped', lambda: subscription.dropped)
+        m.gauge('plc_queue_dropped', lambda: link.dropped)
     try:
         while running:
-            sensor.getForce()
-            a = sensor.force()
-            if len(a) > 2:  # Ensure valid force data
-                Z_sila = (nula - a[2]) / 1000000  # Calculate the force in newtons
-                message = struct.pack('>f', Z_sila)
-                client_socket.sendall(message)
-            time.sleep(0.04)  # Adjust to your needs, currently set to real-time
+            batch = subscription.get_batch(1024, timeout=1.0)  # Samples from the acquisition thread
+            if not batch and subscription.closed:
+                break
+            for sample in batch:
+                if len(nulas) > 1:
+                    # Forces first, so that --average averages the force of every sensor
+                    sample = Sample(sample.time, [compute_z_force(n, d) for n, d in zip(nulas, sample.data)])
+                sample = decimator.add(sample)
+                if sample is not None:
+                    if m is not None:
+                        t0 = time.perf_counter_ns()
+                    if len(nulas) > 1:
+                        link.send(sample.data, sample.time)  # One update, queued and dropped as a whole
+                    else:
+                        Z_sila = compute_z_force(nulas[0], sample.data)  # Calculate the force in newtons
+                        link.send([Z_sila], sample.time)  # Queued; the link thread writes it to the socket
+                    send_stats.mark()
+                    if m is not None:
+                        m.observe('plc_enqueue', time.perf_counter_ns() - t0)
     except KeyboardInterrupt:
         print('Exiting send_data_to_plc thread')
     finally:
-        client_socket.close()  # Close the socket when done
+        send_stats.report()
 
-def manage_csv_logging(client_socket):
+def manage_csv_logging(link, acquisitions):
     global running
-    logging_process = None
+    rotation = None
+    if args.rotate_mb or args.rotate_min:
+        rotation = RotationPolicy(args.rotate_mb, args.rotate_min, compress=not args.no_compress)
+    # Logs in this process from the shared acquisitions: one logger per sensor, or one for all
+    if len(acquisitions) > 1 and args.log_layout == 'combined':
+        loggers = [(CsvLogger(SensorGroup(acquisitions), log_format=args.log_format, base_dir=args.log_dir,
+                              rotation=rotation), nulas)]
+    else:
+        loggers = [(CsvLogger(acquisition, log_format=args.log_format, base_dir=args.log_dir,
+                              suffix=f'_s{i + 1}' if len(acquisitions) > 1 else '', rotation=rotation), nula)
+                   for i, (acquisition, nula) in enumerate(zip(acquisitions, nulas))]
     try:
-        while running:
-            plc_status = get_plc_variable_status(client_socket)
+        # A session keeps logging through a PLC outage; the link reconnects on its own.
+        # Nothing is left to do once every sensor loop has ended (e.g. a replay is over).
+        while running and not link.closed.is_set() and not all(a.ring.closed for a in acquisitions):
+            plc_status = link.get_flag(timeout=0.1)  # Next flag from the PLC, as soon as it arrives
             if plc_status is not None:
                 if plc_status:
-                    if logging_process is None:
-                        logging_process = subprocess.Popen([
-                            'python', 'csvlog.py',
-                            '-n', str(nula)  # Pass the nula value
-                        ])
+                    if not loggers[0][0].active:
+                        start_time = time.monotonic()  # Shared time axis of the sensors' logs
+                        for logger, nula in loggers:
+                            logger.start(nula, start_time)
                         print("Started logging to CSV")
                 else:
-                    if logging_process:
-                        logging_process.terminate()  # Immediately terminate the logging process
-                        logging_process.wait()  # Ensure the CSV script finishes writing
-                        logging_process = None
+                    if loggers[0][0].active:
+                        for logger, _ in loggers:
+                            logger.stop()  # Writes the remaining rows and fsyncs the file
                         print("Stopped logging to CSV")
-            time.sleep(0.01)  # Check PLC status every 100ms
     except KeyboardInterrupt:
         print('Exiting manage_csv_logging thread')
-        if logging_process:
-            logging_process.terminate()
-            logging_process.wait()  # Ensure the CSV script finishes writing
+    finally:
+        for logger, _ in loggers:
+            logger.stop()
 
 if __name__ == '__main__':
     running = True
@@ -135,22 +306,89 @@ if __name__ == '__main__':
                 sensor.receive()
                 print(data())
         elif args.continuous:
-            sensor.startStreaming(False)
-            sensor.getForce()
-            a = sensor.force()
-            if len(a) > 2:  # Check if force data is valid
-                nula = a[2]  # Set the initial nula value
-            else:
-                print("Error: Sensor data invalid at start, force array too short")
-                exit(1)
+            nulas = []  # Zero value of every sensor
+            for s in sensors:
+                s.getForce()
+                a = s.force()
+                if len(a) > 2:  # Check if force data is valid
+                    nulas.append(a[2])  # Set the initial nula value
+                else:
+                    print("Error: Sensor data invalid at start, force array too short")
+                    exit(1)
+            nula = nulas[0]
+
+            # Instrumentation costs a None check per stage unless it is turned on
+            if args.stats_interval or args.stats_port:
+                registry = metrics.enable()
+                if args.stats_interval:
+                    metrics.start_reporter(registry, args.stats_interval)
+                if args.stats_port:
+                    metrics.serve(registry, args.stats_port)
+
+            # Single reader per sensor, all stamping samples with the same monotonic clock;
+            # every consumer subscribes to their samples
+            multiple = len(sensors) > 1
+            acquisitions = [Acquisition(s, rate=args.rate, capacity=65536 if args.stream else 4096,
+                                        streaming=args.stream,
+                                        name=f'Sensor {i + 1} ({ip})' if multiple else 'Acquisition',
+                                        metric_suffix=f'_s{i + 1}' if multiple else '')
+                            for i, (s, ip) in enumerate(zip(sensors, args.ip))]
+
+            publishers = []
+            if args.shm:
+                from shm_ring import ShmPublisher
+                for i, (acquisition, n) in enumerate(zip(acquisitions, nulas)):
+                    publisher = ShmPublisher(acquisition, n, args.shm if i == 0 else f'{args.shm}_s{i + 1}')
+                    publisher.start()
+                    publishers.append(publisher)
 
-            client_socket = connect_to_server()  # Ensure client_socket is available
+            # One non-blocking connection carries both the force values and the logging flag,
+            # and is re-established in the background whenever it drops
+            link = PlcLink(lambda: connect_to_server(args.plc_host, args.plc_port),
+                           frame=args.plc_frame, max_batch=args.plc_batch, queue_size=args.plc_backlog)
+            link.start()
 
-            plc_thread = threading.Thread(target=send_data_to_plc, args=(client_socket,))
+            plc_subscription = SampleAligner([acquisitions[n - 1].subscribe() for n in args.plc_sensors])
+            plc_thread = threading.Thread(target=send_data_to_plc,
+                                          args=(link, plc_subscription, [nulas[n - 1] for n in args.plc_sensors]))
             plc_thread.daemon = True
             plc_thread.start()
 
-            manage_csv_logging(client_socket)
+            if args.replay:
+                link.connected.wait(timeout=10.0)  # So that the PLC sees the replay from its first sample
+            # Started once the PLC sender and the publishers are subscribed, so they get every sample
+            for acquisition in acquisitions:
+                acquisition.start()
+
+            if args.live:
+                # The plot window needs the main thread, so the PLC flag is watched on its own thread
+                from live_plot import LivePlot
+                logging_thread = threading.Thread(target=manage_csv_logging, args=(link, acquisitions))
+                logging_thread.daemon = True
+                logging_thread.start()
+                LivePlot(acquisitions[0].subscribe(), nula, fps=args.live_fps).run()  # First sensor
+                running = False  # Window closed
+                logging_thread.join(timeout=5.0)
+            else:
+                manage_csv_logging(link, acquisitions)
+
+            # Session over: stop the sensor loops, let the PLC thread send what is left and
+            # report its statistics
+            for acquisition in acquisitions:
+                acquisition.stop()
+            for publisher in publishers:
+                publisher.stop()
+            plc_thread.join(timeout=5.0)
+            running = False
+            link.stop()
+            if args.replay:
+                # End-to-end throughput: how much of each log made it through the pipeline, and how fast
+                elapsed = time.monotonic() - min(s.started for s in sensors if s.started is not None)
+                for s in sensors:
+                    s.report()
+                print(f"PLC: {link.sent} values sent in {elapsed:.2f} s ({link.sent / elapsed:.0f} values/s end to end), "
+                      f"{plc_subscription.dropped} samples dropped before the PLC sender, "
+                      f"{link.dropped} values dropped in its send queue")
         else:
             print(get())
 
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class LatencyHistogram:
+    """Latency histogram with power-of-two buckets in nanoseconds.
+
+    Recording is a bit_length and three additions, cheap enough for every sample;
+    percentiles are accurate to within a factor of two, the maximum is exact.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        self.buckets[ns.bit_length()] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """Upper bound (ns) of the bucket holding the q-th fraction of the recorded values."""
+        if not self.count:
+            return 0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(1 << i, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1000 if self.count else 0.0,
+            'p50_us': self.percentile(0.5) / 1000,
+            'p99_us': self.percentile(0.99) / 1000,
+            'max_us': self.max / 1000,
+        }
+
+class Metrics:
+    """Per-stage latency histograms, counters and gauges of a running main.py.
+
+    Every stage and counter is only updated from one thread (the loop it measures), so
+    no locking is needed on the hot path; readers get a snapshot that may be a few
+    samples old. Gauges are functions evaluated when a snapshot is taken.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, ns):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(ns)
+
+    def gauge(self, name, function):
+        self.gauges[name] = function
+
+    def snapshot(self):
+        counters = dict(self.counters)
+        for name, function in list(self.gauges.items()):
+            try:
+                counters[name] = function()
+            except Exception:
+                counters[name] = None
+        return {
+            'uptime_s': time.monotonic() - self.started,
+            'counters': counters,
+            'stages': {name: h.snapshot() for name, h in list(self.histograms.items())},
+        }
+
+    def format_line(self):
+        """One log line: counters, then p50/p99/max in microseconds per stage."""
+        s = self.snapshot()
+        parts = [f"{name}={value}" for name, value in sorted(s['counters'].items())]
+        parts += [f"{name} {h['p50_us']:.0f}/{h['p99_us']:.0f}/{h['max_us']:.0f}us"
+                  for name, h in sorted(s['stages'].items())]
+        return "Stats: " + ", ".join(parts)
+
+# The registry is None unless instrumentation was enabled, so the hot loops only pay
+# for an `if m is not None` check when it is off.
+_metrics = None
+
+def enable():
+    """Turn instrumentation on for this process and return the registry."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+def get():
+    """The active registry, or None when instrumentation is off."""
+    return _metrics
+
+def start_reporter(metrics, interval):
+    """Print metrics.format_line() every interval seconds on a daemon thread."""
+    def report():
+        while True:
+            time.sleep(interval)
+            print(metrics.format_line())
+    thread = threading.Thread(target=report)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def serve(metrics, port, host='127.0.0.1'):
+    """Serve the metrics snapshot as JSON on http://host:port/ from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(metrics.snapshot(), indent=2).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep the console for the measurement output
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    print(f"Stats available on http://{host}:{server.server_address[1]}/")
+    return server
@@ -0,0 +1,276 @@
+import queue
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+import metrics
+
+FLAG_SIZE = 2
+FLAG_ON = b'\x01\x00'  # 0100 in Hex or 1 in Int
+FLAG_OFF = b'\x00\x00'  # 0000 in Hex or 0 in Int
+
+# Batched frame: sequence number, timestamp of the first sample (s), sample count, then the samples
+BATCH_HEADER = struct.Struct('>IdH')
+VALUE = struct.Struct('>f')
+SEND_BUFFER = 4096  # Bytes; the kernel may round it up
+
+class PlcLink:
+    """Supervised, event-driven connection to the PLC.
+
+    One thread owns the socket and multiplexes it with a selector: it reads the 2-byte
+    logging flag into a receive buffer (so a short read can no longer shift the flag
+    protocol) and writes queued force values whenever the socket can take them, so a
+    stalled PLC never blocks the threads that produce the values.
+
+    Updates, one force value per sensor sent, are queued with send() in a bounded queue
+    of queue_size updates; when it is full the oldest update is dropped as a whole, so
+    the PLC can still tell the sensors apart by their position in the stream.
+    frame='float' sends every value as a bare big-endian float32, as the PLC program
+    expects today; frame='batch' sends frames of up to max_batch values (never splitting
+    an update) prefixed with a sequence number, the timestamp of the first value and the
+    count.
+
+    When the connection fails or drops, the same thread reconnects with exponential
+    backoff (min_backoff doubling up to max_backoff seconds, back to min_backoff once a
+    connection has stayed up for max_backoff seconds). send() keeps queueing in
+    the meantime, so the producers never notice; the queue then holds the newest
+    queue_size updates, which are sent once the PLC is back. Every outage is reported
+    with its duration and the number of values dropped.
+    """
+
+    def __init__(self, connect, frame='float', max_batch=32, queue_size=1024,
+                 min_backoff=0.5, max_backoff=10.0):
+        self.connect = connect  # Returns a connected socket, raises OSError otherwise
+        self.frame = frame
+        self.max_batch = max_batch
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.flags = queue.Queue()  # Flag states in the order received
+        self.connected = threading.Event()
+        self.closed = threading.Event()  # Set once the link has been stopped
+        self.sequence = 0
+        self.sent = 0  # Values handed to the socket
+        self.dropped = 0
+        self.reconnects = 0
+        self.outages = 0
+        self.outage_time = 0.0
+        self._queue = deque(maxlen=queue_size)  # Appending to a full deque drops the oldest update
+        self._out = bytearray()
+        self._pending = 0  # Values framed into _out and not sent yet
+        self._frame_time = None
+        self._framed_at = None
+        self._in = bytearray()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._supervise)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, drain_timeout=1.0):
+        """Stop the link, first giving the queued values up to drain_timeout seconds to go out."""
+        deadline = time.monotonic() + drain_timeout
+        while self.connected.is_set() and (self._queue or self._out) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self._stopping.set()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        if self.outages:
+            print(f"PLC link: {self.outages} outages, {self.outage_time:.1f} s disconnected, "
+                  f"{self.reconnects} reconnects, {self.dropped} values dropped")
+
+    def send(self, values, timestamp):
+        """Queue one update, the force (newtons) of every sensor sent, with its sample time; never blocks."""
+        if len(self._queue) == self._queue.maxlen:
+            # Every update holds as many values; the link thread may pop in between and
+            # then this counts one update too many
+            self.dropped += len(values)
+        self._queue.append((timestamp, tuple(values)))
+        self._wake()
+
+    def get_flag(self, timeout=None):
+        """Return the next logging flag state received from the PLC, or None on timeout."""
+        try:
+            return self.flags.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _wake(self):
+        try:
+            self._wakeup_w.send(b'\x00')
+        except (BlockingIOError, OSError):
+            pass  # Already woken up (buffer full) or shutting down
+
+    def _supervise(self):
+        """Connect, run the connection until it ends, and reconnect with backoff until stopped."""
+        m = metrics.get()
+        if m is not None:
+            m.gauge('plc_connected', lambda: int(self.connected.is_set()))
+        delay = self.min_backoff
+        lost_at = None  # Start of the current outage
+        dropped_at = 0
+        first = True
+        try:
+            while not self._stopping.is_set():
+                if not first:
+                    self._stopping.wait(delay)
+                    delay = min(delay * 2, self.max_backoff)
+                    if self._stopping.is_set():
+                        break
+                try:
+                    sock = self.connect()
+                except OSError as e:
+                    if lost_at is None:
+                        lost_at, dropped_at = time.monotonic(), self.dropped
+                    print(f"PLC connection failed: {e}; retrying in {delay:.1f} s")
+                    first = False
+                    continue
+
+                if not first:
+                    self.reconnects += 1
+                    if m is not None:
+                        m.count('plc_reconnects')
+                if lost_at is not None:
+                    outage = time.monotonic() - lost_at
+                    self.outage_time += outage
+                    print(f"PLC connected after {outage:.1f} s without a connection, "
+                          f"{self.dropped - dropped_at} values dropped meanwhile")
+                first = False
+                lost_at = None
+
+                connected_at = time.monotonic()
+                self.connected.set()
+                try:
+                    self._run(sock)
+                finally:
+                    self.connected.clear()
+                # A partly sent frame is lost with the connection
+                lost = self._pending
+                self.dropped += lost
+                self._pending = 0
+                self._out.clear()
+                if not self._stopping.is_set():
+                    self.outages += 1
+                    lost_at, dropped_at = time.monotonic(), self.dropped - lost
+                    if lost_at - connected_at >= self.max_backoff:
+                        delay = self.min_backoff  # The connection was stable; retry quickly
+                    print(f"PLC connection lost, reconnecting in {delay:.1f} s; "
+                          f"values are kept in the send queue")
+        finally:
+            self.closed.set()
+
+    def _run(self, sock):
+        """Serve one connection until it fails or the link is stopped."""
+        self.sock = sock
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Do not hold back small frames
+        # A small kernel buffer, so that values for a stalled PLC wait in the bounded queue
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        sock.setblocking(False)
+        self._in.clear()
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        selector.register(sock, selectors.EVENT_READ)
+        writing = False
+        try:
+            while not self._stopping.is_set():
+                for key, events in selector.select(timeout=1.0):
+                    if key.fileobj is self._wakeup_r:
+                        self._drain_wakeups()
+                    elif events & selectors.EVENT_READ and not self._receive():
+                        return
+                    elif events & selectors.EVENT_WRITE:
+                        self._flush()
+                self._fill_output()
+                while self._out:
+                    self._flush()  # Most writes succeed at once, without waiting for EVENT_WRITE
+                    if self._out:
+                        break  # The socket is full; wait for EVENT_WRITE
+                    self._fill_output()
+                if bool(self._out) != writing:
+                    writing = bool(self._out)
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+                    selector.modify(sock, events)
+        except OSError as e:
+            print(f"PLC connection error: {e}")
+        finally:
+            selector.close()
+            sock.close()
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _receive(self):
+        """Read what the PLC sent and queue every complete flag; False when the PLC closed the connection."""
+        try:
+            data = self.sock.recv(4096)
+        except BlockingIOError:
+            return True
+        if not data:
+            print("PLC closed the connection")
+            return False
+        self._in += data
+        while len(self._in) >= FLAG_SIZE:
+            message = bytes(self._in[:FLAG_SIZE])
+            del self._in[:FLAG_SIZE]
+            if message == FLAG_ON:
+                self.flags.put(True)
+            elif message == FLAG_OFF:
+                self.flags.put(False)
+            else:
+                print(f"Unknown PLC status message: {message!r}")
+        return True
+
+    def _fill_output(self):
+        """Frame the next queued values into the output buffer once the previous ones are out.
+
+        Values only leave the bounded queue when the socket has taken everything framed
+        before, so a stalled PLC holds at most one buffer of values outside the queue
+        (besides the kernel's send buffer); the rest wait in the queue, where the oldest
+        are dropped.
+        """
+        if self._out or not self._queue:
+            return
+        t0 = time.perf_counter_ns()
+        limit = self.max_batch if self.frame == 'batch' else 256
+        timestamp, values = self._queue.popleft()
+        batch = list(values)
+        while self._queue and len(batch) + len(self._queue[0][1]) <= limit:
+            batch += self._queue.popleft()[1]  # Whole updates only
+        if self.frame == 'batch':
+            self.sequence += 1
+            self._out += BATCH_HEADER.pack(self.sequence & 0xFFFFFFFF, timestamp, len(batch))
+        for value in batch:
+            self._out += VALUE.pack(value)
+        self._pending = len(batch)
+        self._frame_time = timestamp  # Sample time of the oldest value in the frame
+        self._framed_at = time.perf_counter_ns()
+        m = metrics.get()
+        if m is not None:
+            m.observe('plc_compute', self._framed_at - t0)  # Framing and packing
+
+    def _flush(self):
+        try:
+            sent = self.sock.send(self._out)
+        except BlockingIOError:
+            return
+        del self._out[:sent]
+        if not self._out:
+            self.sent += self._pending  # Counted once the whole frame is with the kernel
+            m = metrics.get()
+            if m is not None:
+                # From the frame being built until the socket took all of it, waiting included
+                m.observe('plc_send', time.perf_counter_ns() - self._framed_at)
+                m.observe('plc_sample_age', int((time.monotonic() - self._frame_time) * 1e9))
+                m.count('plc_sent', self._pending)
+            self._pending = 0
@@ -1,58 +1,46 @@
 import os
-import csv
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkinter import Tk, Toplevel, Entry, Button, Label, StringVar
 from tkinter.filedialog import askopenfilename
-
-def load_csv_data(file_path):
-    """Loads time and force data from a .csv file and returns two lists."""
-    time_data = []
-    force_data = []
-    with open(file_path, mode='r', newline='') as file:
-        csv_reader = csv.reader(file)
-        next(csv_reader)  # Skip header
-        for row in csv_reader:
-            time_data.append(float(row[0]))
-            force_data.append(float(row[1]))  # Keep both positive and negative forces
-    return time_data, force_data
+from binlog import BIN_EXTENSION
+from loader import load_log_data
+from downsample import LodLine
 
 def filter_low_force_periods(time_data, force_data, threshold=0.25, duration=2.0):
-    """Filters out periods where the force is below the threshold for longer than the given duration."""
-    filtered_time = []
-    filtered_force = []
-    
-    i = 0
-    while i < len(time_data):
-        # Find the next period where the force is continuously below the threshold
-        start_idx = i
-        while i < len(force_data) and abs(force_data[i]) < threshold:
-            i += 1
-        
-        # If this low-force period is longer than the duration, skip it
-        if i - start_idx > 0:
-            period_duration = time_data[i-1] - time_data[start_idx]
-            if period_duration >= duration:
-                print(f"Skipping period from {time_data[start_idx]}s to {time_data[i-1]}s (duration: {period_duration}s)")
-            else:
-                filtered_time.extend(time_data[start_idx:i])
-                filtered_force.extend(force_data[start_idx:i])
-        
-        # Add the remaining data points (force above threshold)
-        while i < len(force_data) and abs(force_data[i]) >= threshold:
-            filtered_time.append(time_data[i])
-            filtered_force.append(force_data[i])
-            i += 1
-
-    return filtered_time, filtered_force
+    """Filters out periods where the force is below the threshold for longer than the given duration.
+
+    Vectorized: the below-threshold runs are found from the edges of a boolean mask and
+    all long runs are removed with a single index mask. Returns two arrays.
+    """
+    time_data = np.asarray(time_data)
+    force_data = np.asarray(force_data)
+    low = np.abs(force_data) < threshold
+
+    # Run boundaries: starts are inclusive, ends exclusive
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], low.view(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    long_runs = time_data[ends - 1] - time_data[starts] >= duration
+    starts, ends = starts[long_runs], ends[long_runs]
+
+    for start_idx, end_idx in zip(starts, ends):
+        print(f"Skipping period from {time_data[start_idx]}s to {time_data[end_idx - 1]}s "
+              f"(duration: {time_data[end_idx - 1] - time_data[start_idx]}s)")
+
+    # +1 at the start and -1 past the end of every skipped run; a positive running sum marks skipped samples
+    marks = np.zeros(len(force_data) + 1, dtype=np.int64)
+    marks[starts] += 1
+    marks[ends] -= 1
+    keep = np.cumsum(marks[:-1]) == 0
+    return time_data[keep], force_data[keep]
 
 def plot_data(root, time_data, force_data, file_name):
     """Plots the time vs force graph with interactive labels."""
     fig, ax = plt.subplots(figsize=(10, 6))
     
-    # Plot the data
-    ax.plot(time_data, force_data, linestyle='-', marker='', color='b')
+    # Plot the data; only a peak-preserving view sized to the axes is drawn, recomputed on zoom/pan
+    LodLine(ax, time_data, force_data, linestyle='-', marker='', color='b')
     
     # Set font properties
     font = {'fontname': 'Times New Roman'}
@@ -63,7 +51,7 @@ def plot_data(root, time_data, force_data, file_name):
     ax.grid(True)
 
     # Set time ticks on x-axis for every second
-    ax.set_xticks(np.arange(min(time_data), max(time_data)+1, 1))
+    ax.set_xticks(np.arange(np.min(time_data), np.max(time_data)+1, 1))
 
     # Integrate with Tkinter
     canvas = FigureCanvasTkAgg(fig, master=root)
@@ -121,13 +109,13 @@ def browse_and_load_file():
     # Open a file dialog and let the user select a file
     file_path = askopenfilename(
         title="Odaberite .csv datoteku",
-        filetypes=[("CSV files", "*.csv")],
+        filetypes=[("Log files", "*.csv *" + BIN_EXTENSION + " *.gz"), ("CSV files", "*.csv")],
         initialdir=r'C:\Users\Ivan\Desktop\NetFT-master\logiranje'
     )
 
     if file_path:
         print(f"Odabrana datoteka: {file_path}")
-        time_data, force_data = load_csv_data(file_path)
+        time_data, force_data = load_log_data(file_path)
         # Apply the filtering function to remove low-force periods
         filtered_time_data, filtered_force_data = filter_low_force_periods(time_data, force_data)
         plot_data(root, filtered_time_data, filtered_force_data, file_path)
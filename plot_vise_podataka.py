@@ -1,105 +1,194 @@
+import argparse
+import glob
 import os
-import csv
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt
-from tkinter import Tk, simpledialog
-from tkinter.filedialog import askopenfilename
-
-def load_csv_data(file_path):
-    """Loads time and force data from a .csv file and returns two lists."""
-    time_data = []
-    force_data = []
-    with open(file_path, mode='r', newline='') as file:
-        csv_reader = csv.reader(file)
-        next(csv_reader)  # Skip header
-        for row in csv_reader:
-            time_data.append(float(row[0]))
-            force_data.append(float(row[1]))  # Učitavamo sve vrijednosti, uključujući negativne
-    return time_data, force_data
-
-def plot_data(time_data1, force_data1, time_data2, force_data2, time_data3, force_data3, title, legend1, legend2, legend3, file_name):
-    """Plots the time vs force graph with custom title and legend."""
-    fig, ax = plt.subplots(figsize=(10, 6))
-    
-    # Plotting the three datasets
-    ax.plot(time_data1, force_data1, label=legend1, color='blue')
-    ax.plot(time_data2, force_data2, label=legend2, color='red')
-    ax.plot(time_data3, force_data3, label=legend3, color='darkgreen')  # Treća datoteka u tamno zelenoj boji
-    
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from binlog import BIN_EXTENSION
+from loader import is_log_file, list_sessions, load_log_data, session_files
+from downsample import LodLine
+
+# Colours of the first three files as before (the third in dark green), then the default cycle
+COLORS = ['blue', 'red', 'darkgreen']
+INITIAL_DIR = r'C:\Users\Ivan\Desktop\NetFT-master\logiranje'
+
+def expand_paths(paths):
+    """Expand files, glob patterns and folders into a list of log files, keeping the given order.
+
+    The chunks of a rotated session count as one log.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if is_log_file(f)))
+        elif glob.has_magic(path):
+            files.extend(sorted(f for f in glob.glob(path) if is_log_file(f)))
+        else:
+            files.append(path)
+    return list_sessions(files)
+
+def load_files(file_paths, workers=None):
+    """Load several logs in parallel processes; returns a list of (time, force) in the same order.
+
+    Parsing a CSV holds the GIL, so threads would load them one after another. Binary
+    logs are only memory-mapped, which is cheap, and stay in this process.
+    """
+    data = [None] * len(file_paths)
+    parse = []
+    for i, file_path in enumerate(file_paths):
+        if all(f.endswith(BIN_EXTENSION) for f in session_files(file_path)):
+            data[i] = load_log_data(file_path)
+        else:
+            parse.append(i)
+    if len(parse) == 1:
+        data[parse[0]] = load_log_data(file_paths[parse[0]])
+    elif parse:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for i, result in zip(parse, executor.map(load_log_data, [file_paths[i] for i in parse])):
+                data[i] = result
+    return data
+
+def draw_data(ax, series, title):
+    """Draws (time, force, legend) series on ax with the labels, ticks and legend of this script."""
+    for i, (time_data, force_data, legend) in enumerate(series):
+        color = COLORS[i] if i < len(COLORS) else f'C{i}'
+        # Downsampled to the axes width, recomputed on zoom/pan
+        LodLine(ax, time_data, force_data, label=legend, color=color)
+
     # Setting labels and title with Times New Roman font
     ax.set_xlabel('Vrijeme, s', fontname='Times New Roman', fontsize=14)
     ax.set_ylabel('Aksijalna sila, N', fontname='Times New Roman', fontsize=14)
     ax.set_title(title, fontname='Times New Roman', fontsize=14)
     ax.grid(True)
-    
+
     # Postavljanje vremenskih oznaka na x-osi svakih 1 sekundu
-    ax.set_xticks(np.arange(min(min(time_data1), min(time_data2), min(time_data3)), max(max(time_data1), max(time_data2), max(time_data3))+1, 1))
-    
+    non_empty = [time_data for time_data, _, _ in series if len(time_data)]
+    if non_empty:
+        ax.set_xticks(np.arange(min(np.min(t) for t in non_empty), max(np.max(t) for t in non_empty)+1, 1))
+
     # Adjust the plot to ensure there is more space at the top for the legend
-    fig.subplots_adjust(top=0.90)  # Increase space at the top of the plot for the legend
-    
-    # Create a draggable legend in the top-right corner
-    legend = ax.legend(loc='upper right')
+    ax.figure.subplots_adjust(top=0.90)  # Increase space at the top of the plot for the legend
+
+    # Legend in the top-right corner
+    return ax.legend(loc='upper right')
+
+def plot_data(series, title, file_name):
+    """Plots the time vs force graph of any number of (time, force, legend) series with custom title."""
+    fig, ax = plt.subplots(figsize=(10, 6))
+    legend = draw_data(ax, series, title)
     legend.set_draggable(True)  # Allow the legend to be moved interactively
-    
+
     # Save the plot as an image
     image_path = os.path.splitext(file_name)[0] + '_updated.png'
     plt.savefig(image_path)
     print(f"Grafikon spremljen kao {image_path}")
-    
+
     plt.show()
 
+def render_png(job):
+    """Headless rendering of one (file_paths, legends, title, image_path) job with the Agg canvas.
+
+    Uses Figure directly instead of pyplot, so it works in worker processes without a display.
+    """
+    file_paths, legends, title, image_path = job
+    series = [(t, f, legend) for (t, f), legend in zip(map(load_log_data, file_paths), legends)]
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    draw_data(fig.add_subplot(), series, title)
+    fig.savefig(image_path)
+    return image_path
+
+def batch_jobs(file_paths, output_dir, group_by, title=None):
+    """Build render jobs: one PNG per log (group_by='file') or one per folder of logs (group_by='folder')."""
+    if group_by == 'file':
+        stems = [os.path.splitext(os.path.basename(f))[0] for f in file_paths]
+        # Logs with the same name in different folders get the folder name as a prefix
+        groups = [(stem if stems.count(stem) == 1 else f"{os.path.basename(os.path.dirname(os.path.abspath(f)))}_{stem}", [f])
+                  for f, stem in zip(file_paths, stems)]
+    else:
+        by_folder = {}
+        for f in file_paths:
+            by_folder.setdefault(os.path.dirname(os.path.abspath(f)), []).append(f)
+        groups = [(os.path.basename(folder), files) for folder, files in by_folder.items()]
+    jobs = []
+    for name, files in groups:
+        legends = [os.path.splitext(os.path.basename(f))[0] for f in files]
+        jobs.append((files, legends, title if title is not None else name, os.path.join(output_dir, name + '.png')))
+    return jobs
+
+def batch_render(file_paths, output_dir, group_by='file', title=None, workers=None):
+    """Render all jobs of a campaign in a process pool."""
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = batch_jobs(file_paths, output_dir, group_by, title)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for image_path in executor.map(render_png, jobs):
+            print(f"Grafikon spremljen kao {image_path}")
+
 def browse_and_load_file():
-    """Opens a file dialog to let the user select .csv files and displays the plot."""
+    """Opens a file dialog to let the user select any number of log files and displays the plot."""
+    from tkinter import Tk, simpledialog
+    from tkinter.filedialog import askopenfilenames
+
     root = Tk()
     root.withdraw()  # Hide the main Tkinter window
 
-    # Prompt for title and legend texts
+    # Prompt for the title
     title = simpledialog.askstring("Naslov", "Unesite naslov grafa:")
-    legend1 = simpledialog.askstring("Legenda", "Unesite tekst za prvu legendu:")
-    legend2 = simpledialog.askstring("Legenda", "Unesite tekst za drugu legendu:")
-    legend3 = simpledialog.askstring("Legenda", "Unesite tekst za treću legendu:")
-
-    # Open a file dialog and let the user select the first file
-    file_path1 = askopenfilename(
-        title="Odaberite prvu .csv datoteku",
-        filetypes=[("CSV files", "*.csv")],
-        initialdir=r'C:\Users\Ivan\Desktop\NetFT-master\logiranje'
+
+    # Open a file dialog and let the user select the files
+    file_paths = askopenfilenames(
+        title="Odaberite .csv datoteke",
+        filetypes=[("Log files", "*.csv *" + BIN_EXTENSION + " *.gz"), ("CSV files", "*.csv")],
+        initialdir=INITIAL_DIR
     )
 
-    if file_path1:
-        print(f"Odabrana prva datoteka: {file_path1}")
-        time_data1, force_data1 = load_csv_data(file_path1)
-        
-        # Open a file dialog and let the user select the second file
-        file_path2 = askopenfilename(
-            title="Odaberite drugu .csv datoteku",
-            filetypes=[("CSV files", "*.csv")],
-            initialdir=r'C:\Users\Ivan\Desktop\NetFT-master\logiranje'
-        )
-
-        if file_path2:
-            print(f"Odabrana druga datoteka: {file_path2}")
-            time_data2, force_data2 = load_csv_data(file_path2)
-            
-            # Open a file dialog and let the user select the third file
-            file_path3 = askopenfilename(
-                title="Odaberite treću .csv datoteku",
-                filetypes=[("CSV files", "*.csv")],
-                initialdir=r'C:\Users\Ivan\Desktop\NetFT-master\logiranje'
-            )
-
-            if file_path3:
-                print(f"Odabrana treća datoteka: {file_path3}")
-                time_data3, force_data3 = load_csv_data(file_path3)
-
-                plot_data(time_data1, force_data1, time_data2, force_data2, time_data3, force_data3, title, legend1, legend2, legend3, file_path1)
-            else:
-                print("Nije odabrana treća datoteka.")
-        else:
-            print("Nije odabrana druga datoteka.")
-    else:
-        print("Nije odabrana prva datoteka.")
+    if not file_paths:
+        print("Nije odabrana nijedna datoteka.")
+        return
+    file_paths = list_sessions(file_paths)  # Several chunks of one session are one series
+
+    # Prompt for the legend texts, the file name is the default
+    legends = []
+    for file_path in file_paths:
+        print(f"Odabrana datoteka: {file_path}")
+        default = os.path.splitext(os.path.basename(file_path))[0]
+        legend = simpledialog.askstring("Legenda", f"Unesite tekst legende za {default}:", initialvalue=default)
+        legends.append(legend if legend is not None else default)
+
+    data = load_files(file_paths)
+    series = [(t, f, legend) for (t, f), legend in zip(data, legends)]
+    plot_data(series, title, file_paths[0])
+
+def main():
+    parser = argparse.ArgumentParser(description="Usporedni grafovi sile za više zapisa")
+    parser.add_argument('paths', nargs='*', help="Datoteke, uzorci (npr. 'logs/*.csv') ili mape; bez njih otvara se dijalog")
+    parser.add_argument('--title', default=None, help="Naslov grafa")
+    parser.add_argument('--legend', action='append', default=None, help="Tekst legende, jednom po datoteci")
+    parser.add_argument('--batch', metavar='DIR', default=None, help="Bez prozora: spremi PNG grafove u mapu DIR")
+    parser.add_argument('--group-by', choices=['file', 'folder'], default='file', help="U skupnom načinu jedan graf po datoteci ili po mapi")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Broj paralelnih procesa/dretvi")
+    args = parser.parse_args()
+
+    if not args.paths:
+        browse_and_load_file()
+        return
+
+    file_paths = expand_paths(args.paths)
+    if not file_paths:
+        print("Nije pronađena nijedna datoteka.")
+        return
+    if args.batch:
+        batch_render(file_paths, args.batch, args.group_by, args.title, args.workers)
+        return
+
+    # Files without a --legend get their file name
+    legends = args.legend or []
+    legends = legends + [os.path.splitext(os.path.basename(f))[0] for f in file_paths[len(legends):]]
+    data = load_files(file_paths, args.workers)
+    series = [(t, f, legend) for (t, f), legend in zip(data, legends)]
+    plot_data(series, args.title or '', file_paths[0])
 
 if __name__ == '__main__':
-    browse_and_load_file()
+    main()
@@ -0,0 +1,120 @@
+import socket
+import time
+import numpy as np
+from binlog import BIN_EXTENSION, read_header
+from loader import load_log_data, session_files
+
+class ReplaySensor:
+    """Stand-in for NetFT.Sensor that plays a recorded log back through main.py.
+
+    The logged force is turned back into raw Fz counts around the log's zero value
+    (from the binary header, 0 for CSV logs), with the other axes at 0, so that nula
+    and compute_z_force give back the logged force. getMeasurement/getForce return the
+    sensor at rest, which is what main.py reads its nula from; receive() returns the
+    logged samples one by one, each once its time has come: at the logged rate for
+    speed=1, speed times faster, or as fast as possible for speed=0. When the log is
+    exhausted receive() raises EOFError.
+    """
+
+    def __init__(self, file_path, speed=1.0):
+        self.file_path = file_path
+        self.speed = speed
+        time_data, force_data = load_log_data(file_path)
+        times = np.asarray(time_data, dtype=np.float64)
+        self.times = (times - times[0]).tolist() if len(times) else []  # Seconds from the first sample
+        self.nula = 0.0
+        first = session_files(file_path)[0]
+        if first.endswith(BIN_EXTENSION):
+            self.nula = read_header(first)['nula']
+        # Raw counts such that compute_z_force(nula, data) is the logged force again
+        self.fz = (self.nula - np.asarray(force_data, dtype=np.float64) * 1000000).tolist()
+        self.sock = self  # Acquisition sets the receive timeout on sensor.sock
+        self.timeout = None
+        self.mean = [0] * 6
+        self.data = self._reading(self.nula)
+        self.index = 0
+        self.started = None
+        self.finished = None
+        self.late_max = 0.0
+        self.late_count = 0
+
+    def _reading(self, fz):
+        return [0 - self.mean[0], 0 - self.mean[1], fz - self.mean[2],
+                0 - self.mean[3], 0 - self.mean[4], 0 - self.mean[5]]
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def send(self, command, count=0):
+        pass  # Commands only matter to a real Net F/T box
+
+    def getMeasurements(self, n):
+        pass
+
+    def startStreaming(self, handler=True):
+        self.started = time.monotonic()
+
+    def stopStreaming(self):
+        pass
+
+    def tare(self, n=10):
+        self.mean = [0, 0, self.nula, 0, 0, 0]  # What averaging n readings at rest gives
+        self.data = self._reading(self.nula)
+        return self.mean
+
+    def zero(self):
+        self.mean = [0] * 6
+
+    def receive(self):
+        """Return the next logged sample once it is due; socket.timeout if it is not due within the timeout."""
+        if self.index >= len(self.fz):
+            if self.finished is None:
+                self.finished = time.monotonic()
+            raise EOFError(f"end of {self.file_path}")
+        if self.started is None:
+            self.started = time.monotonic()
+        if self.speed:
+            due = self.started + self.times[self.index] / self.speed
+            wait = due - time.monotonic()
+            if wait > 0:
+                if self.timeout is not None and wait > self.timeout:
+                    time.sleep(self.timeout)
+                    raise socket.timeout("replay: next sample not due yet")
+                time.sleep(wait)
+            elif wait < -0.001:
+                self.late_count += 1  # Delivered more than 1 ms behind the schedule
+                self.late_max = max(self.late_max, -wait)
+        self.data = self._reading(self.fz[self.index])
+        self.index += 1
+        return self.data
+
+    def getMeasurement(self):
+        return self._reading(self.nula)  # The sensor at rest, before the replayed session
+
+    def measurement(self):
+        return self.data
+
+    def getForce(self):
+        return self.getMeasurement()[:3]
+
+    def force(self):
+        return self.measurement()[:3]
+
+    def getTorque(self):
+        return self.getMeasurement()[3:]
+
+    def torque(self):
+        return self.measurement()[3:]
+
+    def report(self):
+        """Print how fast the log was replayed compared to how it was recorded."""
+        if self.started is None or not self.index:
+            print(f"Replay of {self.file_path}: nothing replayed")
+            return
+        elapsed = (self.finished or time.monotonic()) - self.started
+        logged = self.times[self.index - 1]
+        print(f"Replay of {self.file_path}: {self.index} of {len(self.fz)} samples in {elapsed:.2f} s, "
+              f"{self.index / elapsed if elapsed else 0.0:.0f} samples/s, "
+              f"{logged / elapsed if elapsed else 0.0:.1f}x the recorded speed"
+              + (f", {self.late_count} samples more than 1 ms late (max {self.late_max * 1000:.1f} ms)"
+                 if self.speed else ""))
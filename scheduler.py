@@ -0,0 +1,123 @@
+import random
+import time
+from array import array
+
+class PeriodStats:
+    """Collects the intervals between successive events and summarises their jitter.
+
+    Count, mean, min and max (and the maximum jitter) are exact running values; the p99
+    figures come from a uniform random sample of at most reservoir_size periods, so the
+    memory used stays the same however long a session runs.
+    """
+
+    def __init__(self, name, rate=None, reservoir_size=65536):
+        self.name = name
+        self.rate = rate  # Target rate in Hz, if there is one
+        self.overruns = 0
+        self.missed = 0
+        self.count = 0
+        self._total = 0.0
+        self._min = float('inf')
+        self._max = 0.0
+        self._jitter_max = 0.0
+        self._target = 1.0 / rate if rate else None
+        self._reservoir = array('d')
+        self._reservoir_size = reservoir_size
+        self._random = random.Random(0)
+        self._last = None
+
+    def mark(self, now=None):
+        """Record an event at the given (or current) monotonic time."""
+        if now is None:
+            now = time.monotonic()
+        if self._last is not None:
+            self._add(now - self._last)
+        self._last = now
+
+    def _add(self, period):
+        self.count += 1
+        self._total += period
+        if period < self._min:
+            self._min = period
+        if period > self._max:
+            self._max = period
+        if self._target is not None:
+            deviation = abs(period - self._target)
+            if deviation > self._jitter_max:
+                self._jitter_max = deviation
+        # Reservoir sampling: every period so far is kept with the same probability
+        if len(self._reservoir) < self._reservoir_size:
+            self._reservoir.append(period)
+        else:
+            i = self._random.randrange(self.count)
+            if i < self._reservoir_size:
+                self._reservoir[i] = period
+
+    def summary(self):
+        """Return period statistics in seconds, or None if fewer than two events were marked."""
+        if not self.count:
+            return None
+        periods = sorted(self._reservoir)
+        n = len(periods)
+        result = {
+            'count': self.count,
+            'min': self._min,
+            'mean': self._total / self.count,
+            'p99': periods[min(n - 1, int(n * 0.99))],
+            'max': self._max,
+            'overruns': self.overruns,
+            'missed': self.missed,
+        }
+        if self._target is not None:
+            deviations = sorted(abs(p - self._target) for p in periods)
+            result['jitter_p99'] = deviations[min(n - 1, int(n * 0.99))]
+            result['jitter_max'] = self._jitter_max
+        return result
+
+    def report(self):
+        """Print a one-line summary of the collected periods."""
+        s = self.summary()
+        if s is None:
+            print(f"{self.name}: not enough samples for period statistics")
+            return
+        line = (f"{self.name}: {s['count']} periods, "
+                f"period min/mean/p99/max = {s['min'] * 1000:.3f}/{s['mean'] * 1000:.3f}/"
+                f"{s['p99'] * 1000:.3f}/{s['max'] * 1000:.3f} ms")
+        if self.rate:
+            line += (f", achieved {1.0 / s['mean']:.1f} Hz of {self.rate:g} Hz, "
+                     f"jitter p99/max = {s['jitter_p99'] * 1000:.3f}/{s['jitter_max'] * 1000:.3f} ms, "
+                     f"overruns {s['overruns']} (missed periods {s['missed']})")
+        print(line)
+
+class RateScheduler:
+    """Runs a loop at a fixed rate on absolute monotonic deadlines.
+
+    Unlike a plain sleep after the work, the period does not grow by the time the work
+    takes. An iteration that finishes after its deadline is counted as an overrun, and
+    deadlines that were missed completely are skipped so the loop keeps its phase.
+    """
+
+    def __init__(self, rate, name='scheduler'):
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.stats = PeriodStats(name, rate)
+        self._deadline = None
+
+    def wait(self):
+        """Sleep until the next deadline. The first call starts the schedule."""
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        else:
+            self._deadline += self.period
+            if now >= self._deadline:
+                self.stats.overruns += 1
+                missed = int((now - self._deadline) // self.period)
+                self.stats.missed += missed
+                self._deadline += missed * self.period
+            else:
+                time.sleep(self._deadline - now)
+        self.stats.mark()
+
+    def report(self):
+        self.stats.report()
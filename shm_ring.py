@@ -0,0 +1,195 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from acquisition import compute_z_force
+
+# Header: magic, capacity (records), record size, zero value (nula), then the sequence
+# number (total records ever written) at SEQUENCE_OFFSET and the number of records
+# written once the write in progress is done at WRITING_OFFSET, padded to 64 bytes
+HEADER = struct.Struct('<8sQQd')
+MAGIC = b'NFTSHM\x00\x02'
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = 32
+WRITING_OFFSET = 40
+
+# One 64-byte record per sample: monotonic time (s), raw Fx..Tz counts, Z force (N)
+RECORD = np.dtype([('time', '<f8'), ('fx', '<f8'), ('fy', '<f8'), ('fz', '<f8'),
+                   ('tx', '<f8'), ('ty', '<f8'), ('tz', '<f8'), ('force', '<f8')])
+
+class SharedRing:
+    """Ring of fixed-width sample records in a named shared memory block.
+
+    One process writes (see ShmPublisher), any number of processes attach and read
+    without locks, seqlock style: the writer first announces how far the write will
+    reach, then stores the records and then advances the sequence number, so a reader
+    only ever looks at published records. A reader that is too slow can have its
+    records overwritten while it looks at them; latest() and records_since() therefore
+    return the sequence number they started at, and intact(), checked after reading,
+    tells whether any of those records was overwritten or is being overwritten. Times are time.monotonic()
+    of the writer, which is the same clock for every process on the machine.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        magic, self.capacity, itemsize, self.nula = HEADER.unpack_from(shm.buf)
+        if magic != MAGIC or itemsize != RECORD.itemsize:
+            raise ValueError(f"{shm.name} is not a sample ring")
+        self._sequence = np.ndarray((1,), dtype='<u8', buffer=shm.buf, offset=SEQUENCE_OFFSET)
+        self._writing = np.ndarray((1,), dtype='<u8', buffer=shm.buf, offset=WRITING_OFFSET)
+        self.records = np.ndarray((self.capacity,), dtype=RECORD, buffer=shm.buf, offset=HEADER_SIZE)
+
+    @classmethod
+    def create(cls, name, capacity=65536, nula=0.0):
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=HEADER_SIZE + capacity * RECORD.itemsize)
+        HEADER.pack_into(shm.buf, 0, MAGIC, capacity, RECORD.itemsize, nula)
+        struct.pack_into('<QQ', shm.buf, SEQUENCE_OFFSET, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        # By default the resource tracker of every process that opens the block (POSIX only)
+        # unlinks it when that process exits; a reader must leave it to the publisher
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix':
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    @property
+    def sequence(self):
+        """Number of records written so far; the newest one is sequence - 1."""
+        return int(self._sequence[0])
+
+    def write(self, records):
+        """Append a structured array of RECORD (single writer only)."""
+        n = len(records)
+        if not n:
+            return
+        if n > self.capacity:
+            records = records[-self.capacity:]
+        sequence = self.sequence
+        start = (sequence + n - len(records)) % self.capacity
+        first = min(len(records), self.capacity - start)  # Part that fits before the end
+        self._writing[0] = sequence + n  # Announce the slots about to be overwritten
+        self.records[start:start + first] = records[:first]
+        self.records[:len(records) - first] = records[first:]
+        self._sequence[0] = sequence + n  # Publish after the records are in place
+
+    def latest(self, n):
+        """The newest n records (fewer if not written yet) and the sequence number of the first.
+
+        A view into shared memory, without copying, unless the records wrap around
+        the end of the ring; then a copy.
+        """
+        end = self.sequence
+        n = min(n, end, self.capacity)
+        start = end - n
+        i = start % self.capacity
+        if i + n <= self.capacity:
+            return self.records[i:i + n], start
+        return np.concatenate((self.records[i:], self.records[:i + n - self.capacity])), start
+
+    def records_since(self, sequence):
+        """Copy of every record from sequence on, the sequence number of the first and how many were lost."""
+        end = self.sequence
+        start = max(sequence, end - self.capacity)
+        records, first = self.latest(end - start)
+        return records.copy(), first, first - sequence
+
+    def intact(self, start):
+        """True while the records from sequence number start on are neither overwritten nor being overwritten."""
+        return int(self._writing[0]) - self.capacity <= start
+
+    def close(self):
+        self._sequence = self._writing = self.records = None  # Release the views before the block
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class ShmPublisher:
+    """Copies the samples of an Acquisition into a SharedRing on its own thread.
+
+    It is one more subscriber of the acquisition, so the sensor loop does not do any
+    extra work; samples are written in batches.
+    """
+
+    def __init__(self, acquisition, nula, name, capacity=65536):
+        self.subscription = acquisition.subscribe()
+        self.nula = nula
+        self.ring = SharedRing.create(name, capacity, nula)
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"Publishing samples to shared memory '{self.ring.shm.name}'")
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.ring.close()
+
+    def _run(self):
+        nula = self.nula
+        while self._running:
+            batch = self.subscription.get_batch(4096, timeout=0.1)
+            if not batch:
+                if self.subscription.closed:
+                    break
+                continue
+            records = np.empty(len(batch), dtype=RECORD)
+            records['time'] = [sample.time for sample in batch]
+            raw = np.array([sample.data[:6] for sample in batch], dtype=np.float64)
+            for i, field in enumerate(('fx', 'fy', 'fz', 'tx', 'ty', 'tz')):
+                records[field] = raw[:, i]
+            records['force'] = [compute_z_force(nula, sample.data) for sample in batch]
+            self.ring.write(records)
+
+def describe_latest(ring, n):
+    """One line about the newest n records, or None if they were overwritten while reading."""
+    records, start = ring.latest(n)
+    if len(records) < 2:
+        return None
+    force = records['force']
+    span = records['time'][-1] - records['time'][0]
+    line = (f"#{start + len(records)}: force {force[-1]:.6f} N, "
+            f"min/mean/max {force.min():.6f}/{force.mean():.6f}/{force.max():.6f} N, "
+            f"{(len(records) - 1) / span if span else 0.0:.1f} Hz")
+    return line if ring.intact(start) else None  # Otherwise the writer lapped us
+
+def main():
+    """Attach to a running main.py (--shm NAME) and print the live force and sample rate."""
+    parser = argparse.ArgumentParser(description="Read the live samples published in shared memory")
+    parser.add_argument('name', help="Shared memory name given to main.py --shm")
+    parser.add_argument('-n', type=int, default=1000, help="Samples per printed window (default 1000)")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between lines (default 1)")
+    args = parser.parse_args()
+
+    ring = SharedRing.attach(args.name)
+    try:
+        while True:
+            line = describe_latest(ring, args.n)
+            if line:
+                print(line)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()  # No view into the block may be alive here
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import argparse
+import socket
+import struct
+import threading
+import time
+from array import array
+from scheduler import RateScheduler
+
+# NetFT.Sensor always talks to this UDP port
+NETFT_PORT = 49152
+RDT_REQUEST = struct.Struct('!HHI')  # header 0x1234, command, sample count
+RDT_RECORD = struct.Struct('!IIIiiiiii')  # rdt sequence, ft sequence, status, Fx, Fy, Fz, Tx, Ty, Tz
+BATCH_HEADER = struct.Struct('>IdH')  # Batched PLC frame, see plc_link.py
+FLAG_ON = b'\x01\x00'
+FLAG_OFF = b'\x00\x00'
+
+def decode_sequence(force, first_sequence=1):
+    """Recover the sensor sequence number from a force computed by main.py or csvlog.py.
+
+    FakeNetFT sends Fz = -sequence counts, and the zero value (nula) is the first packet
+    served, so force = (sequence - first_sequence) / 1e6.
+    """
+    return int(round(force * 1000000)) + first_sequence
+
+class FakeNetFT:
+    """Stand-in for an ATI Net F/T box on localhost, speaking the RDT request/stream protocol.
+
+    Answers command 2 with the requested number of records (count 0 streams at `rate`
+    until command 0) and answers nothing else. Every record carries a running sequence
+    number in Fz (see decode_sequence); the send time of every record is kept in
+    send_times (index sequence - 1), the arrival time of every request in request_times.
+    """
+
+    def __init__(self, host='127.0.0.1', port=NETFT_PORT, rate=1000.0):
+        self.rate = rate
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.sequence = 0
+        self.send_times = array('d')
+        self.request_times = array('d')
+        self._lock = threading.Lock()
+        self._running = False
+        self._streaming = None  # Client address while streaming
+        self._threads = []
+
+    def start(self):
+        self._running = True
+        for target in (self._serve, self._stream):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self.sock.close()
+
+    def _send_record(self, address):
+        with self._lock:
+            self.sequence += 1
+            sequence = self.sequence
+            self.send_times.append(time.monotonic())
+        self.sock.sendto(RDT_RECORD.pack(sequence, sequence, 0, 0, 0, -sequence, 0, 0, 0), address)
+
+    def _serve(self):
+        while self._running:
+            try:
+                message, address = self.sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.request_times.append(time.monotonic())
+            header, command, count = RDT_REQUEST.unpack(message[:RDT_REQUEST.size])
+            if command == 0:
+                self._streaming = None
+            elif command == 2 and count == 0:
+                self._streaming = address
+            elif command == 2:
+                for _ in range(count):
+                    self._send_record(address)
+
+    def _stream(self):
+        scheduler = RateScheduler(self.rate, name='FakeNetFT stream')
+        while self._running:
+            address = self._streaming
+            if address is None:
+                time.sleep(0.01)
+                continue
+            try:
+                self._send_record(address)
+            except OSError:
+                break
+            scheduler.wait()
+
+class FakePLC:
+    """Stand-in for the PLC TCP server: toggles the 2-byte logging flag and records what it receives.
+
+    The flag is raised for `on_time` seconds, `cycles` times, with `off_time` seconds
+    between (and before the first) cycle. Raw received bytes are kept in chunks with
+    their arrival times so any framing can be decoded afterwards.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_time=2.0, off_time=1.0, cycles=3):
+        self.on_time = on_time
+        self.off_time = off_time
+        self.cycles = cycles
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.chunks = []  # (arrival time, bytes)
+        self.toggles = []  # (time, flag state)
+        self.connected = threading.Event()
+        self.done = threading.Event()
+        self.connections = 0
+        self.outages = []  # (start, end)
+        self._refuse_until = 0.0
+        self._connection = None
+        self._running = False
+
+    def start(self):
+        self._running = True
+        for target in (self._accept, self._toggle):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        self.server.close()
+        if self._connection is not None:
+            self._connection.close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                break
+            if time.monotonic() < self._refuse_until:
+                connection.close()  # Still "down": the client sees the connection drop at once
+                continue
+            self._connection = connection
+            self.connections += 1
+            self.connected.set()
+            self._receive(connection)
+
+    def _receive(self, connection):
+        while self._running:
+            try:
+                data = connection.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            self.chunks.append((time.monotonic(), data))
+
+    def send_flag(self, state):
+        connection = self._connection
+        if connection is None:
+            return
+        try:
+            connection.sendall(FLAG_ON if state else FLAG_OFF)
+        except OSError:
+            return  # Connection dropped; the flag is lost like on the real PLC
+        self.toggles.append((time.monotonic(), state))
+
+    def outage(self, duration):
+        """Drop the current connection and refuse new ones for duration seconds."""
+        now = time.monotonic()
+        self._refuse_until = now + duration
+        self.outages.append((now, now + duration))
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    def _toggle(self):
+        self.connected.wait()
+        for _ in range(self.cycles):
+            time.sleep(self.off_time)
+            self.send_flag(True)
+            time.sleep(self.on_time)
+            self.send_flag(False)
+        time.sleep(self.off_time)
+        self.done.set()
+
+    def received_floats(self):
+        """Decode the received bytes as bare big-endian float32 values: [(arrival time, value)]."""
+        values = []
+        pending = b''
+        for arrival, data in self.chunks:
+            pending += data
+            usable = len(pending) - len(pending) % 4
+            for (value,) in struct.iter_unpack('>f', pending[:usable]):
+                values.append((arrival, value))
+            pending = pending[usable:]
+        return values
+
+    def received_batches(self):
+        """Decode batched frames: [(arrival time, value)] plus the number of sequence gaps."""
+        values = []
+        pending = b''
+        expected = None
+        gaps = 0
+        for arrival, data in self.chunks:
+            pending += data
+            while len(pending) >= BATCH_HEADER.size:
+                sequence, _, count = BATCH_HEADER.unpack_from(pending)
+                size = BATCH_HEADER.size + 4 * count
+                if len(pending) < size:
+                    break
+                if expected is not None and sequence != expected:
+                    gaps += 1
+                expected = sequence + 1
+                for (value,) in struct.iter_unpack('>f', pending[BATCH_HEADER.size:size]):
+                    values.append((arrival, value))
+                pending = pending[size:]
+        return values, gaps
+
+def main():
+    """Run the fake sensor and PLC until interrupted, e.g. to try main.py without the rig."""
+    parser = argparse.ArgumentParser(description="Simulated NetFT sensor and PLC server")
+    parser.add_argument('--sensor-rate', type=float, default=1000.0, help="RDT streaming rate in Hz (default 1000)")
+    parser.add_argument('--plc-port', type=int, default=2000, help="PLC TCP port (default 2000)")
+    parser.add_argument('--on', type=float, default=5.0, help="Seconds the logging flag stays raised")
+    parser.add_argument('--off', type=float, default=5.0, help="Seconds between logging cycles")
+    parser.add_argument('--cycles', type=int, default=1000000, help="Number of logging cycles")
+    args = parser.parse_args()
+
+    sensor = FakeNetFT(rate=args.sensor_rate)
+    plc = FakePLC(port=args.plc_port, on_time=args.on, off_time=args.off, cycles=args.cycles)
+    sensor.start()
+    plc.start()
+    print(f"Fake NetFT on 127.0.0.1:{NETFT_PORT}, fake PLC on 127.0.0.1:{plc.port}")
+    try:
+        while not plc.done.is_set():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        plc.stop()
+        sensor.stop()
+        print(f"Sensor records sent: {sensor.sequence}, PLC bytes received: {sum(len(d) for _, d in plc.chunks)}")
+
+if __name__ == '__main__':
+    main()
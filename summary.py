@@ -0,0 +1,55 @@
+import math
+import numpy as np
+
+class ForceSummary:
+    """Single-pass statistics of a force series, updated chunk by chunk.
+
+    Nothing but the running reductions is kept, so the series can be arbitrarily long:
+    sample count, min, max, mean, the time of the peak (maximum) force and the duration.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+        self.peak_time = None
+        self.first_time = None
+        self.last_time = None
+
+    def update(self, time_data, force_data):
+        """Add a chunk of samples (any sequences or arrays of equal length)."""
+        force_data = np.asarray(force_data, dtype=np.float64)
+        if not len(force_data):
+            return
+        time_data = np.asarray(time_data, dtype=np.float64)
+        peak_idx = int(force_data.argmax())
+        if force_data[peak_idx] > self.max:
+            self.max = float(force_data[peak_idx])
+            self.peak_time = float(time_data[peak_idx])
+        self.min = min(self.min, float(force_data.min()))
+        self.sum += float(force_data.sum())
+        if self.first_time is None:
+            self.first_time = float(time_data[0])
+        self.last_time = float(time_data[-1])
+        self.count += len(force_data)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    @property
+    def duration(self):
+        return self.last_time - self.first_time if self.count else None
+
+    def as_dict(self):
+        """Return the statistics; min/max/mean/peak_time/duration are None for an empty series."""
+        empty = self.count == 0
+        return {
+            'samples': self.count,
+            'duration': self.duration,
+            'min': None if empty else self.min,
+            'max': None if empty else self.max,
+            'mean': self.mean,
+            'peak_time': self.peak_time,
+        }
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from plot_pojedinacno import filter_low_force_periods
+
+def filter_low_force_periods_loop(time_data, force_data, threshold=0.25, duration=2.0):
+    """The original loop implementation, the reference for the vectorized one."""
+    filtered_time = []
+    filtered_force = []
+
+    i = 0
+    while i < len(time_data):
+        # Find the next period where the force is continuously below the threshold
+        start_idx = i
+        while i < len(force_data) and abs(force_data[i]) < threshold:
+            i += 1
+
+        # If this low-force period is longer than the duration, skip it
+        if i - start_idx > 0:
+            period_duration = time_data[i-1] - time_data[start_idx]
+            if period_duration >= duration:
+                print(f"Skipping period from {time_data[start_idx]}s to {time_data[i-1]}s (duration: {period_duration}s)")
+            else:
+                filtered_time.extend(time_data[start_idx:i])
+                filtered_force.extend(force_data[start_idx:i])
+
+        # Add the remaining data points (force above threshold)
+        while i < len(force_data) and abs(force_data[i]) >= threshold:
+            filtered_time.append(time_data[i])
+            filtered_force.append(force_data[i])
+            i += 1
+
+    return filtered_time, filtered_force
+
+def check_same(capsys, time_data, force_data, **kwargs):
+    expected_time, expected_force = filter_low_force_periods_loop(time_data, force_data, **kwargs)
+    expected_output = capsys.readouterr().out
+    filtered_time, filtered_force = filter_low_force_periods(time_data, force_data, **kwargs)
+    assert np.array_equal(filtered_time, expected_time)
+    assert np.array_equal(filtered_force, expected_force)
+    assert capsys.readouterr().out == expected_output  # Same skip messages
+
+@pytest.mark.parametrize('force_data', [
+    [],
+    [0.1],
+    [1.0],
+    [0.1] * 50,  # All low
+    [1.0] * 50,  # All high
+    [0.1] * 30 + [1.0] * 10 + [0.1] * 30,  # Low runs at both ends
+    [1.0] * 10 + [0.1] * 30 + [1.0] * 10,
+    [0.25, -0.25, 0.2499, -0.2499] * 10,  # Exactly at the threshold, both signs
+])
+@pytest.mark.parametrize('duration', [0.0, 0.5, 2.0])
+def test_edge_cases(capsys, force_data, duration):
+    time_data = np.arange(len(force_data)) * 0.1
+    check_same(capsys, time_data, np.array(force_data), duration=duration)
+
+@pytest.mark.parametrize('seed', range(300))
+def test_random(capsys, seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(0, 400))
+    time_data = np.cumsum(rng.uniform(0.001, 0.2, n))
+    # Long runs of low and high force, so that runs of every length occur
+    force_data = np.repeat(rng.choice([0.1, -0.1, 0.5, -3.0], size=n), rng.integers(1, 30, n))[:n]
+    force_data = force_data * rng.uniform(0.5, 1.5, n)
+    check_same(capsys, time_data, force_data,
+               threshold=float(rng.uniform(0.05, 0.6)), duration=float(rng.uniform(0.0, 3.0)))
@@ -0,0 +1,61 @@
+import math
+import time
+from acquisition import STALE_DATA, Sample, SampleAligner, SampleRing
+
+def make_aligner(sensors=2, **kwargs):
+    rings = [SampleRing(capacity=65536) for _ in range(sensors)]
+    return rings, SampleAligner([ring.subscribe() for ring in rings], **kwargs)
+
+def reading(value):
+    return (0, 0, value, 0, 0, 0)
+
+def test_aligns_on_reference_timestamps():
+    rings, aligner = make_aligner()
+    now = time.monotonic()
+    for k in range(5):
+        rings[1].publish(Sample(now + k * 0.01 - 0.001, reading(100 + k)))
+        rings[0].publish(Sample(now + k * 0.01, reading(k)))
+    batch = aligner.get_batch(100, timeout=0)
+    # The last reference sample waits until sensor 2 has a newer sample
+    assert [s.data for s in batch] == [(reading(k), reading(100 + k)) for k in range(4)]
+
+def test_stalled_sensor_does_not_block_the_others():
+    rings, aligner = make_aligner(max_pending=1000, stale_after=0.05)
+    start = time.monotonic() - 10.0
+    rings[1].publish(Sample(start, reading(7)))  # Then sensor 2 stalls, without closing its ring
+    batch = []
+    for k in range(1, 200001):
+        rings[0].publish(Sample(start + k * 0.00001, reading(k)))
+        if k % 500 == 0:
+            batch += aligner.get_batch(1000, timeout=0)
+    assert len(batch) == 200000 and aligner.dropped == 0
+    assert all(s.data[1] == reading(7) for s in batch)  # Its last sample is repeated
+    assert all(len(queue) <= 1000 for queue in aligner._pending)
+
+def test_pending_samples_are_bounded_and_counted():
+    rings, aligner = make_aligner(max_pending=100, stale_after=60.0)
+    now = time.monotonic()
+    for k in range(1000):
+        rings[0].publish(Sample(now + k * 0.001, reading(k)))
+    for _ in range(20):
+        assert aligner.get_batch(1000, timeout=0) == []  # Sensor 2 has not delivered yet
+    assert len(aligner._pending[0]) == 100
+    assert aligner.dropped == 900
+
+def test_sensor_that_never_started_is_nan_once_stale():
+    rings, aligner = make_aligner(stale_after=0.05)
+    rings[0].publish(Sample(time.monotonic() - 1.0, reading(1)))
+    batch = aligner.get_batch(10, timeout=0)
+    assert len(batch) == 1
+    assert batch[0].data[0] == reading(1)
+    assert batch[0].data[1] is STALE_DATA and all(math.isnan(v) for v in STALE_DATA)
+
+def test_stalled_reference_keeps_others_bounded():
+    rings, aligner = make_aligner(max_pending=100)
+    now = time.monotonic()
+    for k in range(10000):
+        rings[1].publish(Sample(now + k * 0.001, reading(k)))
+    for _ in range(200):
+        assert aligner.get_batch(10, timeout=0) == []
+    assert len(aligner._pending[1]) == 100
+    assert aligner.dropped == 9900